@@ -0,0 +1,121 @@
+"""Async read views of the hottest endpoints.
+
+Routed in front of the viewsets when ``ASYNC_READ_VIEWS`` is on, which
+is the default for the ASGI server profile. They answer GET and HEAD
+with the same payloads as the viewsets, awaiting the cache and the
+database instead of holding a worker thread; other methods are passed
+to the sync viewsets.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django_filters import utils
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.exceptions import (APIException, AuthenticationFailed,
+                                       NotFound)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .authentication import TOKEN_KEYWORD, aauthenticate
+from .cache import (aapply_recipe_overlay, aget_blob, aget_recipe_fragments,
+                    blob_response)
+from .filters import RecipeFilter
+from .ingredient_index import ingredient_index
+from .pagination import CachedCountPagination
+from .serializers import IngredientSerializer, TagSerializer
+from .views import RecipeViewSet
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def json_response(data, status=200):
+    return HttpResponse(
+        JSONRenderer().render(data),
+        content_type='application/json',
+        status=status,
+    )
+
+
+def exception_response(exc):
+    if isinstance(exc.detail, (list, dict)):
+        data = exc.detail
+    else:
+        data = {'detail': exc.detail}
+    response = json_response(data, exc.status_code)
+    if isinstance(exc, AuthenticationFailed):
+        response['WWW-Authenticate'] = TOKEN_KEYWORD
+    return response
+
+
+def with_sync_fallback(async_view, sync_view):
+    """Serve reads with ``async_view`` and everything else with the viewset.
+
+    ``csrf_exempt`` is set by hand: in Django 4.2 the decorator turns an
+    async view into a sync one.
+    """
+    async def view(request, *args, **kwargs):
+        if request.method not in READ_METHODS:
+            return await sync_to_async(sync_view)(request, *args, **kwargs)
+        request = Request(request)
+        try:
+            request.user = await aauthenticate(request)
+            return await async_view(request, *args, **kwargs)
+        except APIException as exc:
+            return exception_response(exc)
+
+    view.csrf_exempt = True
+    return view
+
+
+def filter_recipes(request):
+    filterset = RecipeFilter(
+        request.query_params,
+        queryset=Recipe.objects.only('id'),
+        request=request,
+    )
+    if not filterset.is_valid():
+        raise utils.translate_validation(filterset.errors)
+    return filterset.qs
+
+
+async def get_recipes_data(request, recipe_ids):
+    return await aapply_recipe_overlay(
+        request,
+        await aget_recipe_fragments(
+            recipe_ids, RecipeViewSet._render_recipes
+        ),
+    )
+
+
+async def recipe_list(request):
+    queryset = await sync_to_async(filter_recipes)(request)
+    paginator = CachedCountPagination()
+    page = await paginator.apaginate_queryset(queryset, request)
+    data = await get_recipes_data(request, [recipe.id for recipe in page])
+    return json_response(paginator.get_paginated_response(data).data)
+
+
+async def recipe_detail(request, pk):
+    recipe_id = await Recipe.objects.filter(pk=pk).values_list(
+        'id', flat=True
+    ).afirst()
+    if recipe_id is None:
+        raise NotFound
+    return json_response((await get_recipes_data(request, [recipe_id]))[0])
+
+
+async def ingredient_list(request):
+    name = request.query_params.get('name')
+    if name:
+        return json_response(await sync_to_async(ingredient_index.search)(
+            name
+        ))
+    return blob_response(request, await aget_blob(
+        'ingredients',
+        lambda: IngredientSerializer(Ingredient.objects.all(), many=True).data
+    ))
+
+
+async def tag_list(request):
+    return blob_response(request, await aget_blob(
+        'tags', lambda: TagSerializer(Tag.objects.all(), many=True).data
+    ))
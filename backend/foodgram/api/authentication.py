@@ -0,0 +1,154 @@
+import hashlib
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import router, transaction
+from rest_framework import exceptions
+from rest_framework.authentication import (TokenAuthentication,
+                                           get_authorization_header)
+from rest_framework.authtoken.models import Token
+
+TOKEN_KEYWORD = 'Token'
+TOKEN_CACHE_KEY = 'auth_token_{}'
+# Left out of cached users and loaded from the database when accessed.
+UNCACHED_USER_FIELDS = ('password',)
+
+token_cache_stats = Counter()
+
+
+def _token_cache_key(key):
+    # Keep raw tokens out of the cache keys.
+    return TOKEN_CACHE_KEY.format(hashlib.sha1(key.encode()).hexdigest())
+
+
+def _check_token(token):
+    if token is None:
+        raise exceptions.AuthenticationFailed('Invalid token.')
+    if not token.user.is_active:
+        raise exceptions.AuthenticationFailed('User inactive or deleted.')
+    return token
+
+
+def _dump_token(token):
+    """Return the cache entry of ``token``, without the password hash."""
+    user_fields = [
+        field.attname for field in token.user._meta.concrete_fields
+        if field.attname not in UNCACHED_USER_FIELDS
+    ]
+    return {
+        'token': (token.key, token.user_id, token.created),
+        'user': (
+            user_fields, [getattr(token.user, name) for name in user_fields]
+        ),
+    }
+
+
+def _load_token(entry):
+    """Rebuild the token of a cache entry as if read from the database.
+
+    Uncached user fields are deferred, so ``save()`` leaves them alone
+    and reading them runs a query.
+    """
+    user_model = get_user_model()
+    user = user_model.from_db(
+        router.db_for_read(user_model), *entry['user']
+    )
+    token = Token.from_db(
+        router.db_for_read(Token), ['key', 'user_id', 'created'],
+        entry['token'],
+    )
+    token.user = user
+    return token
+
+
+def get_token(key):
+    """Return the token ``key`` with its user, going to the cache first.
+
+    Entries live for ``AUTH_TOKEN_CACHE_TIMEOUT`` seconds and are dropped
+    when the token is deleted or its user is saved; the cache has to be
+    shared by all processes for that to reach them, see ``CACHES``.
+    Counter columns may lag behind on the cached user.
+    """
+    cache_key = _token_cache_key(key)
+    entry = cache.get(cache_key)
+    if entry is not None:
+        token_cache_stats['hits'] += 1
+        return _check_token(_load_token(entry))
+    token_cache_stats['misses'] += 1
+    token = Token.objects.select_related('user').filter(key=key).first()
+    if token is not None:
+        cache.set(
+            cache_key, _dump_token(token), settings.AUTH_TOKEN_CACHE_TIMEOUT
+        )
+    return _check_token(token)
+
+
+async def aget_token(key):
+    cache_key = _token_cache_key(key)
+    entry = await cache.aget(cache_key)
+    if entry is not None:
+        token_cache_stats['hits'] += 1
+        return _check_token(_load_token(entry))
+    token_cache_stats['misses'] += 1
+    token = await Token.objects.select_related('user').filter(
+        key=key
+    ).afirst()
+    if token is not None:
+        await cache.aset(
+            cache_key, _dump_token(token), settings.AUTH_TOKEN_CACHE_TIMEOUT
+        )
+    return _check_token(token)
+
+
+def invalidate_tokens(keys):
+    """Drop cached tokens now and again when the transaction commits.
+
+    The second delete removes entries cached from the old rows by
+    requests served before the commit.
+    """
+    cache_keys = [_token_cache_key(key) for key in keys]
+    if not cache_keys:
+        return
+    cache.delete_many(cache_keys)
+
+    def on_commit():
+        cache.delete_many(cache_keys)
+        token_cache_stats['invalidations'] += len(cache_keys)
+
+    transaction.on_commit(on_commit)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` answering repeated requests from the cache."""
+
+    keyword = TOKEN_KEYWORD
+
+    def authenticate_credentials(self, key):
+        token = get_token(key)
+        return token.user, token
+
+
+async def aauthenticate(request):
+    """Async counterpart of ``CachedTokenAuthentication.authenticate``.
+
+    Returns the user of the ``Authorization: Token <key>`` header, or an
+    anonymous user when the header is missing or uses another scheme.
+    """
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != TOKEN_KEYWORD.lower().encode():
+        return AnonymousUser()
+    if len(auth) != 2:
+        raise exceptions.AuthenticationFailed(
+            'Invalid token header. Token string should not contain spaces.'
+        )
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        raise exceptions.AuthenticationFailed(
+            'Invalid token header. Token string should not contain invalid '
+            'characters.'
+        )
+    return (await aget_token(key)).user
@@ -0,0 +1,194 @@
+"""Microbenchmarks of the hot API units.
+
+``seed_fixtures`` builds a reproducible dataset from a seed and
+``get_cases`` returns the timed callables keyed by name. The
+``benchmark`` management command runs them inside a rolled back
+transaction and compares the results with a stored baseline.
+"""
+import base64
+import io
+import random
+from itertools import combinations
+
+from django.contrib.auth import get_user_model
+from PIL import Image
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag)
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from .filters import IngredientFilter, RecipeFilter
+from .serializers import RecipeCreateSerializer, RecipeSerializer
+from .services import get_shoping_cart_file, get_shopping_cart
+from .views import RecipeViewSet
+
+User = get_user_model()
+
+INGREDIENTS_PER_RECIPE = 8
+
+
+class Fixtures:
+    def __init__(self, user, recipes, tags, ingredients):
+        self.user = user
+        self.recipes = recipes
+        self.tags = tags
+        self.ingredients = ingredients
+        self.created_files = []
+
+
+def seed_fixtures(seed, recipes_count):
+    rng = random.Random(seed)
+    users = User.objects.bulk_create(
+        User(
+            email=f'bench{i}@example.com',
+            username=f'bench{i}',
+            first_name='Bench',
+            last_name=str(i),
+        )
+        for i in range(20)
+    )
+    tags = Tag.objects.bulk_create(
+        Tag(name=f'bench tag {i}', color=f'#BE{i:04d}', slug=f'bench-{i}')
+        for i in range(6)
+    )
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(
+            name=f'bench {word} {i}',
+            measurement_unit=rng.choice(('g', 'ml', 'pcs')),
+        )
+        for i in range(500)
+        for word in [rng.choice(('apple', 'beef', 'carrot', 'dill'))]
+    )
+    recipes = Recipe.objects.bulk_create(
+        Recipe(
+            author=rng.choice(users),
+            name=f'bench recipe {i}',
+            image='recipes/bench.png',
+            text='benchmark recipe ' * 10,
+            cooking_time=rng.randint(1, 120),
+        )
+        for i in range(recipes_count)
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+        for recipe in recipes
+        for tag in rng.sample(tags, 2)
+    )
+    IngredientInRecipe.objects.bulk_create(
+        IngredientInRecipe(
+            recipe=recipe, ingredient=ingredient, amount=rng.randint(1, 500)
+        )
+        for recipe in recipes
+        for ingredient in rng.sample(ingredients, INGREDIENTS_PER_RECIPE)
+    )
+    user = users[0]
+    cart = rng.sample(recipes, min(30, len(recipes)))
+    Favorite.objects.bulk_create(
+        Favorite(user=user, recipe=recipe) for recipe in cart
+    )
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=user, recipe=recipe) for recipe in cart
+    )
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=user_id, ingredient_id=ingredient_id, total_amount=total
+        )
+        for (user_id, ingredient_id), total in
+        ShoppingListItem.objects.compute().items()
+        if user_id == user.id
+    )
+    return Fixtures(user, recipes, tags, ingredients)
+
+
+def make_request(user, method='get', data=None):
+    factory = APIRequestFactory()
+    request = Request(getattr(factory, method)('/', data, format='json'))
+    request.user = user
+    return request
+
+
+def make_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (200, 200), 'red').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+def get_cases(fixtures):
+    user = fixtures.user
+    request = make_request(user)
+    recipe_ids = [recipe.id for recipe in fixtures.recipes]
+    payload = {
+        'name': 'benchmark',
+        'text': 'benchmark',
+        'cooking_time': 10,
+        'image': make_image(),
+        'tags': [tag.id for tag in fixtures.tags[:2]],
+        'ingredients': [
+            {'id': ingredient.id, 'amount': 10}
+            for ingredient in fixtures.ingredients[:INGREDIENTS_PER_RECIPE]
+        ],
+    }
+    tag_sets = [
+        [tag.slug for tag in combination]
+        for size in (1, 2, 3)
+        for combination in combinations(fixtures.tags, size)
+    ]
+
+    def serialize_recipes():
+        queryset = RecipeViewSet._get_recipes_queryset().filter(
+            id__in=recipe_ids
+        )
+        return RecipeSerializer(
+            queryset, many=True, context={'request': request}
+        ).data
+
+    def validate_recipe():
+        serializer = RecipeCreateSerializer(
+            data=payload, context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+
+    def create_recipe():
+        serializer = RecipeCreateSerializer(
+            data=payload, context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        recipe = serializer.save()
+        fixtures.created_files.append(recipe.image.name)
+
+    def filter_recipes():
+        for slugs in tag_sets:
+            list(RecipeFilter(
+                {'tags': slugs},
+                queryset=Recipe.objects.only('id'),
+                request=request,
+            ).qs[:6])
+
+    def filter_ingredients():
+        for prefix in ('bench a', 'bench b', 'bench c', 'bench d'):
+            list(IngredientFilter(
+                {'name': prefix}, queryset=Ingredient.objects.all()
+            ).qs)
+
+    def shopping_cart_file(file_format):
+        def render():
+            return b''.join(
+                chunk.encode() if isinstance(chunk, str) else chunk
+                for chunk in get_shoping_cart_file(
+                    get_shopping_cart(user), file_format
+                ).streaming_content
+            )
+        return render
+
+    return {
+        f'RecipeSerializer x{len(recipe_ids)}': serialize_recipes,
+        'RecipeCreateSerializer.validate': validate_recipe,
+        'RecipeCreateSerializer.create': create_recipe,
+        f'RecipeFilter tags x{len(tag_sets)}': filter_recipes,
+        'IngredientFilter prefix x4': filter_ingredients,
+        'shopping cart txt': shopping_cart_file('txt'),
+        'shopping cart csv': shopping_cart_file('csv'),
+        'shopping cart pdf': shopping_cart_file('pdf'),
+    }
@@ -0,0 +1,235 @@
+import gzip
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+from recipes.models import Favorite, ShoppingCart
+from rest_framework.renderers import JSONRenderer
+from users.models import Subscribe
+
+BLOB_CACHE_KEY = 'api_blob_{}'
+RECIPE_FRAGMENT_VERSION = 2
+RECIPE_FRAGMENT_CACHE_KEY = 'recipe_fragment_v{}_{}'
+USER_ID_SET_CACHE_KEY = 'user_{}_{}'
+USER_ID_SETS = {
+    'favorites': (Favorite, 'recipe_id'),
+    'shopping_carts': (ShoppingCart, 'recipe_id'),
+    'subscriptions': (Subscribe, 'author_id'),
+}
+
+
+def build_blob(data):
+    body = JSONRenderer().render(data)
+    return {
+        'body': body,
+        'gzip_body': gzip.compress(body),
+        'etag': hashlib.sha1(body).hexdigest(),
+        'last_modified': int(time.time()),
+    }
+
+
+def get_blob(name, get_data):
+    """Return the pre-rendered JSON blob ``name``, building it on a miss."""
+    key = BLOB_CACHE_KEY.format(name)
+    blob = cache.get(key)
+    if blob is None:
+        blob = build_blob(get_data())
+        cache.set(key, blob, settings.REFERENCE_DATA_CACHE_TIMEOUT)
+    return blob
+
+
+async def aget_blob(name, get_data):
+    """Async ``get_blob``; ``get_data`` runs in a worker thread."""
+    key = BLOB_CACHE_KEY.format(name)
+    blob = await cache.aget(key)
+    if blob is None:
+        blob = build_blob(await sync_to_async(get_data)())
+        await cache.aset(key, blob, settings.REFERENCE_DATA_CACHE_TIMEOUT)
+    return blob
+
+
+def invalidate_blob(name):
+    cache.delete(BLOB_CACHE_KEY.format(name))
+
+
+def blob_response(request, blob):
+    """Serve ``blob`` honouring conditional and compressed requests."""
+    use_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    etag = '"{}{}"'.format(blob['etag'], '-gz' if use_gzip else '')
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if_modified_since = parse_http_date_safe(
+        request.META.get('HTTP_IF_MODIFIED_SINCE', '')
+    )
+    if if_none_match is not None:
+        not_modified = etag in if_none_match or if_none_match == '*'
+    else:
+        not_modified = (
+            if_modified_since is not None
+            and blob['last_modified'] <= if_modified_since
+        )
+    if not_modified:
+        response = HttpResponseNotModified()
+    elif use_gzip:
+        response = HttpResponse(
+            blob['gzip_body'], content_type='application/json'
+        )
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(blob['body'], content_type='application/json')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(blob['last_modified'])
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def _recipe_fragment_key(recipe_id):
+    return RECIPE_FRAGMENT_CACHE_KEY.format(RECIPE_FRAGMENT_VERSION, recipe_id)
+
+
+def _split_cached_fragments(recipe_ids, cached):
+    keys = {recipe_id: _recipe_fragment_key(recipe_id)
+            for recipe_id in recipe_ids}
+    fragments = {
+        recipe_id: cached[key]
+        for recipe_id, key in keys.items() if key in cached
+    }
+    missing = [
+        recipe_id for recipe_id in recipe_ids if recipe_id not in fragments
+    ]
+    return fragments, missing
+
+
+def _ordered_fragments(recipe_ids, fragments):
+    return [
+        fragments[recipe_id] for recipe_id in recipe_ids
+        if recipe_id in fragments
+    ]
+
+
+def get_recipe_fragments(recipe_ids, render):
+    """Return viewer-independent recipe payloads in ``recipe_ids`` order.
+
+    ``render`` receives the ids missing from the cache and returns their
+    payloads, which are stored for the following requests.
+    """
+    fragments, missing = _split_cached_fragments(
+        recipe_ids, cache.get_many(map(_recipe_fragment_key, recipe_ids))
+    )
+    if missing:
+        rendered = {fragment['id']: fragment for fragment in render(missing)}
+        cache.set_many(
+            {_recipe_fragment_key(recipe_id): data
+             for recipe_id, data in rendered.items()},
+            settings.RECIPE_CACHE_TIMEOUT,
+        )
+        fragments.update(rendered)
+    return _ordered_fragments(recipe_ids, fragments)
+
+
+async def aget_recipe_fragments(recipe_ids, render):
+    """Async ``get_recipe_fragments``; ``render`` runs in a thread."""
+    fragments, missing = _split_cached_fragments(
+        recipe_ids,
+        await cache.aget_many(map(_recipe_fragment_key, recipe_ids)),
+    )
+    if missing:
+        rendered = {
+            fragment['id']: fragment
+            for fragment in await sync_to_async(render)(missing)
+        }
+        await cache.aset_many(
+            {_recipe_fragment_key(recipe_id): data
+             for recipe_id, data in rendered.items()},
+            settings.RECIPE_CACHE_TIMEOUT,
+        )
+        fragments.update(rendered)
+    return _ordered_fragments(recipe_ids, fragments)
+
+
+def invalidate_recipe_fragments(recipe_ids):
+    cache.delete_many([
+        _recipe_fragment_key(recipe_id) for recipe_id in recipe_ids
+    ])
+
+
+def get_user_id_set(user_id, kind):
+    """Return the cached ids of favorites, carts or followed authors."""
+    key = USER_ID_SET_CACHE_KEY.format(user_id, kind)
+    ids = cache.get(key)
+    if ids is None:
+        model, field = USER_ID_SETS[kind]
+        ids = frozenset(
+            model.objects.filter(user_id=user_id).values_list(
+                field, flat=True
+            )
+        )
+        cache.set(key, ids, settings.RECIPE_CACHE_TIMEOUT)
+    return ids
+
+
+async def aget_user_id_set(user_id, kind):
+    key = USER_ID_SET_CACHE_KEY.format(user_id, kind)
+    ids = await cache.aget(key)
+    if ids is None:
+        model, field = USER_ID_SETS[kind]
+        ids = frozenset([
+            value async for value in model.objects.filter(
+                user_id=user_id
+            ).values_list(field, flat=True)
+        ])
+        await cache.aset(key, ids, settings.RECIPE_CACHE_TIMEOUT)
+    return ids
+
+
+def invalidate_user_id_set(user_id, kind):
+    cache.delete(USER_ID_SET_CACHE_KEY.format(user_id, kind))
+
+
+def apply_recipe_overlay(request, fragments):
+    """Fill the viewer-dependent fields into cached recipe fragments."""
+    user = request.user
+    if user.is_authenticated:
+        id_sets = [
+            get_user_id_set(user.id, kind) for kind in USER_ID_SETS
+        ]
+    else:
+        id_sets = [frozenset()] * len(USER_ID_SETS)
+    return _overlay(request, fragments, *id_sets)
+
+
+async def aapply_recipe_overlay(request, fragments):
+    user = request.user
+    if user.is_authenticated:
+        id_sets = [
+            await aget_user_id_set(user.id, kind) for kind in USER_ID_SETS
+        ]
+    else:
+        id_sets = [frozenset()] * len(USER_ID_SETS)
+    return _overlay(request, fragments, *id_sets)
+
+
+def _overlay(request, fragments, favorites, shopping_carts, subscriptions):
+    return [
+        {
+            **fragment,
+            'author': {
+                **fragment['author'],
+                'is_subscribed': fragment['author']['id'] in subscriptions,
+            },
+            'is_favorite': fragment['id'] in favorites,
+            'is_in_shopping_cart': fragment['id'] in shopping_carts,
+            'image': (
+                request.build_absolute_uri(fragment['image'])
+                if fragment['image'] else fragment['image']
+            ),
+            'image_renditions': {
+                key: request.build_absolute_uri(url)
+                for key, url in fragment['image_renditions'].items()
+            },
+        }
+        for fragment in fragments
+    ]
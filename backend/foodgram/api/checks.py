@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core import checks
+
+# Backends keeping entries in the memory of one process.
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def is_cache_shared(alias='default'):
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+def check_shared_cache(app_configs, **kwargs):
+    if is_cache_shared():
+        return []
+    return [checks.Warning(
+        'The default cache is local to each process.',
+        hint='Cached recipes, id sets, counts and tokens are invalidated '
+             'only in the process that changes the data. Set '
+             'CACHE_BACKEND to a shared backend such as Redis when more '
+             'than one process serves the API or runs jobs.',
+        id='api.W001',
+    )]
@@ -1,14 +1,70 @@
 import base64
+import binascii
 
-from django.core.files.base import ContentFile
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
+from recipes.images import process_image
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
 
 class Base64ImageField(serializers.ImageField):
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            decoded_file = base64.b64decode(data.split(',')[1])
-            file_name = 'image.jpg'
-            data = ContentFile(decoded_file, name=file_name)
-        return super().to_internal_value(data)
+            try:
+                content = base64.b64decode(data.split(',')[1], validate=True)
+            except (IndexError, binascii.Error):
+                self.fail('invalid_image')
+        elif hasattr(data, 'read'):
+            content = data.read()
+        else:
+            return super().to_internal_value(data)
+        try:
+            image = process_image(content, with_renditions=False)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(error.messages)
+        return serializers.FileField.to_internal_value(self, image)
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """Maps rendition keys of a stored image to their URLs."""
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for key, name in (value or {}).items():
+            url = default_storage.url(name)
+            urls[key] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Resolves all submitted primary keys with a single query."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        try:
+            pks = [int(pk) for pk in data]
+        except (TypeError, ValueError):
+            child.fail('incorrect_type', data_type=type(data).__name__)
+        objects = child.get_queryset().in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                child.fail('does_not_exist', pk_value=pk)
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
@@ -1,5 +1,6 @@
 from django_filters import rest_framework as filters
 from recipes.models import Ingredient, Recipe
+from recipes.search import search_recipes
 
 
 class IngredientFilter(filters.FilterSet):
@@ -10,15 +11,37 @@ class IngredientFilter(filters.FilterSet):
         fields = ('name',)
 
 
+class StableOrderingFilter(filters.OrderingFilter):
+    """Ordering filter that breaks ties by the newest recipe first."""
+
+    def filter(self, qs, value):
+        qs = super().filter(qs, value)
+        if value:
+            qs = qs.order_by(*qs.query.order_by, '-id')
+        return qs
+
+
 class RecipeFilter(filters.FilterSet):
     author = filters.NumberFilter(field_name='author__id')
     tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
     is_favorite = filters.BooleanFilter(method='filter_is_favorite')
+    search = filters.CharFilter(method='filter_search')
+    ordering = StableOrderingFilter(
+        fields=(
+            ('favorites_count', 'popularity'),
+            ('in_carts_count', 'in_carts'),
+        )
+    )
 
     class Meta:
         model = Recipe
         fields = ['tags', 'author']
 
+    def filter_search(self, queryset, name, value):
+        if value.strip():
+            return search_recipes(queryset, value.strip())
+        return queryset
+
     def filter_is_favorite(self, queryset, name, value):
         if value:
             return queryset.filter(favorites__user=self.request.user)
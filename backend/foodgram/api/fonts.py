@@ -0,0 +1,211 @@
+import os
+import struct
+from functools import lru_cache
+
+from django.conf import settings
+
+# Tables a PDF viewer needs from an embedded TrueType font.
+SUBSET_TABLES = (
+    b'cvt ', b'fpgm', b'glyf', b'head', b'hhea', b'hmtx', b'loca', b'maxp',
+    b'prep',
+)
+# Composite glyph flags.
+ARG_1_AND_2_ARE_WORDS = 0x0001
+WE_HAVE_A_SCALE = 0x0008
+MORE_COMPONENTS = 0x0020
+WE_HAVE_AN_X_AND_Y_SCALE = 0x0040
+WE_HAVE_A_TWO_BY_TWO = 0x0080
+
+
+def _checksum(data):
+    data += b'\0' * (-len(data) % 4)
+    return sum(struct.unpack(f'>{len(data) // 4}L', data)) & 0xFFFFFFFF
+
+
+class TrueTypeFont:
+    """Just enough of a TrueType reader to embed a font subset in a PDF.
+
+    Glyphs are addressed by id, characters are mapped through the
+    Windows Unicode BMP ``cmap``.
+    """
+
+    def __init__(self, path):
+        self.name = os.path.splitext(os.path.basename(path))[0].replace(
+            ' ', ''
+        )
+        with open(path, 'rb') as file:
+            self.data = file.read()
+        num_tables, = struct.unpack_from('>H', self.data, 4)
+        self.tables = {}
+        for index in range(num_tables):
+            tag, _, offset, length = struct.unpack_from(
+                '>4sLLL', self.data, 12 + 16 * index
+            )
+            self.tables[tag] = (offset, length)
+        head = self.table(b'head')
+        self.units_per_em, = struct.unpack_from('>H', head, 18)
+        self.bbox = struct.unpack_from('>4h', head, 36)
+        long_loca, = struct.unpack_from('>h', head, 50)
+        hhea = self.table(b'hhea')
+        self.ascent, self.descent = struct.unpack_from('>2h', hhea, 4)
+        num_metrics, = struct.unpack_from('>H', hhea, 34)
+        self.num_glyphs, = struct.unpack_from('>H', self.table(b'maxp'), 4)
+        advances = struct.unpack_from(
+            f'>{num_metrics}L', self.table(b'hmtx')
+        )
+        advances = [metric >> 16 for metric in advances]
+        self.advances = advances + advances[-1:] * (
+            self.num_glyphs - num_metrics
+        )
+        self.loca = struct.unpack_from(
+            '>%d%s' % (self.num_glyphs + 1, 'L' if long_loca else 'H'),
+            self.table(b'loca'),
+        )
+        if not long_loca:
+            self.loca = [offset * 2 for offset in self.loca]
+        self.cmap = self._read_cmap()
+
+    def table(self, tag):
+        offset, length = self.tables[tag]
+        return self.data[offset:offset + length]
+
+    def glyph_id(self, char):
+        return self.cmap.get(ord(char), 0)
+
+    def width(self, glyph_id):
+        """Advance width in thousandths of the font size."""
+        return round(self.advances[glyph_id] * 1000 / self.units_per_em)
+
+    def scale(self, value):
+        return round(value * 1000 / self.units_per_em)
+
+    def _read_cmap(self):
+        cmap = self.table(b'cmap')
+        num_tables, = struct.unpack_from('>H', cmap, 2)
+        for index in range(num_tables):
+            platform, encoding, offset = struct.unpack_from(
+                '>HHL', cmap, 4 + 8 * index
+            )
+            format_, = struct.unpack_from('>H', cmap, offset)
+            if (platform, encoding) in ((3, 1), (0, 3)) and format_ == 4:
+                return self._read_cmap_format_4(cmap, offset)
+        raise ValueError('The font has no Unicode BMP cmap of format 4')
+
+    @staticmethod
+    def _read_cmap_format_4(cmap, offset):
+        segments = struct.unpack_from('>H', cmap, offset + 6)[0] // 2
+        ends_at = offset + 14
+        starts_at = ends_at + 2 * segments + 2
+        deltas_at = starts_at + 2 * segments
+        range_offsets_at = deltas_at + 2 * segments
+        ends = struct.unpack_from(f'>{segments}H', cmap, ends_at)
+        starts = struct.unpack_from(f'>{segments}H', cmap, starts_at)
+        deltas = struct.unpack_from(f'>{segments}h', cmap, deltas_at)
+        range_offsets = struct.unpack_from(
+            f'>{segments}H', cmap, range_offsets_at
+        )
+        mapping = {}
+        for index, (start, end) in enumerate(zip(starts, ends)):
+            for code in range(start, min(end, 0xFFFE) + 1):
+                if not range_offsets[index]:
+                    glyph_id = (code + deltas[index]) & 0xFFFF
+                else:
+                    glyph_id, = struct.unpack_from(
+                        '>H', cmap, range_offsets_at + 2 * index
+                        + range_offsets[index] + 2 * (code - start)
+                    )
+                    if glyph_id:
+                        glyph_id = (glyph_id + deltas[index]) & 0xFFFF
+                if glyph_id:
+                    mapping[code] = glyph_id
+        return mapping
+
+    def _glyph(self, glyph_id):
+        start = self.tables[b'glyf'][0]
+        return self.data[
+            start + self.loca[glyph_id]:start + self.loca[glyph_id + 1]
+        ]
+
+    def _components(self, glyph):
+        if len(glyph) < 10 or struct.unpack_from('>h', glyph)[0] >= 0:
+            return
+        position = 10
+        while True:
+            flags, glyph_id = struct.unpack_from('>HH', glyph, position)
+            yield glyph_id
+            position += 4 + (4 if flags & ARG_1_AND_2_ARE_WORDS else 2)
+            if flags & WE_HAVE_A_SCALE:
+                position += 2
+            elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+                position += 4
+            elif flags & WE_HAVE_A_TWO_BY_TWO:
+                position += 8
+            if not flags & MORE_COMPONENTS:
+                return
+
+    def subset(self, glyph_ids):
+        """Return a font file keeping only the outlines of ``glyph_ids``.
+
+        Glyph ids stay the same, other glyphs are left empty, so the
+        subset can be used with an identity glyph mapping.
+        """
+        keep = {0}
+        pending = list(glyph_ids)
+        while pending:
+            glyph_id = pending.pop()
+            if glyph_id not in keep:
+                keep.add(glyph_id)
+                pending.extend(self._components(self._glyph(glyph_id)))
+        glyf = bytearray()
+        loca = []
+        for glyph_id in range(self.num_glyphs):
+            loca.append(len(glyf))
+            if glyph_id in keep:
+                glyf += self._glyph(glyph_id)
+                glyf += b'\0' * (-len(glyf) % 4)
+        loca.append(len(glyf))
+        head = bytearray(self.table(b'head'))
+        struct.pack_into('>L', head, 8, 0)
+        struct.pack_into('>h', head, 50, 1)
+        tables = {
+            tag: self.table(tag)
+            for tag in SUBSET_TABLES if tag in self.tables
+        }
+        tables.update({
+            b'glyf': bytes(glyf),
+            b'head': bytes(head),
+            b'loca': struct.pack(f'>{len(loca)}L', *loca),
+        })
+        return self._build(tables)
+
+    @staticmethod
+    def _build(tables):
+        num_tables = len(tables)
+        entry_selector = num_tables.bit_length() - 1
+        search_range = 16 << entry_selector
+        directory = struct.pack(
+            '>LHHHH', 0x00010000, num_tables, search_range,
+            entry_selector, num_tables * 16 - search_range,
+        )
+        body = b''
+        offset = len(directory) + 16 * num_tables
+        for tag in sorted(tables):
+            data = tables[tag]
+            directory += struct.pack(
+                '>4sLLL', tag, _checksum(data), offset + len(body), len(data)
+            )
+            body += data + b'\0' * (-len(data) % 4)
+        font = bytearray(directory + body)
+        head_offset, = struct.unpack_from(
+            '>L', font, 12 + 16 * sorted(tables).index(b'head') + 8
+        )
+        struct.pack_into(
+            '>L', font, head_offset + 8,
+            (0xB1B0AFBA - _checksum(bytes(font))) & 0xFFFFFFFF,
+        )
+        return bytes(font)
+
+
+@lru_cache(maxsize=None)
+def get_pdf_font():
+    return TrueTypeFont(settings.SHOPPING_CART_PDF_FONT)
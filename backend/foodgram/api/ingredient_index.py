@@ -0,0 +1,82 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.cache import cache
+from recipes.models import Ingredient
+
+VERSION_CACHE_KEY = 'ingredient_index_version'
+
+
+class IngredientIndex:
+    """Case-folded in-memory index answering ingredient name lookups.
+
+    Names are kept sorted so prefix matches are found with ``bisect``;
+    substring matches, found with ``str.find`` over all names joined into
+    one string, are appended after them. The index is built on the
+    first lookup in each worker and rebuilt once the shared version in
+    the cache changes or ``INGREDIENT_INDEX_TTL`` seconds have passed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._items = []
+        self._text = ''
+        self._offsets = []
+        self._version = None
+        self._built_at = None
+
+    def _is_stale(self):
+        return (
+            self._built_at is None
+            or time.monotonic() - self._built_at
+            > settings.INGREDIENT_INDEX_TTL
+            or cache.get(VERSION_CACHE_KEY) != self._version
+        )
+
+    def _build(self):
+        version = cache.get_or_set(VERSION_CACHE_KEY, time.time_ns, None)
+        entries = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit'
+            )
+        )
+        self._keys = [entry[0] for entry in entries]
+        self._items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in entries
+        ]
+        self._text = '\n'.join(self._keys)
+        self._offsets = [0, *accumulate(len(key) + 1 for key in self._keys)]
+        self._version = version
+        self._built_at = time.monotonic()
+
+    def search(self, query):
+        if self._is_stale():
+            with self._lock:
+                if self._is_stale():
+                    self._build()
+        keys, items = self._keys, self._items
+        text, offsets = self._text, self._offsets
+        query = query.casefold().replace('\n', ' ')
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\U0010ffff', start)
+        result = items[start:end]
+        for low, high in ((0, offsets[start]), (offsets[end], len(text))):
+            found = text.find(query, low, high)
+            while found != -1:
+                position = bisect_right(offsets, found) - 1
+                result.append(items[position])
+                found = text.find(query, offsets[position + 1], high)
+        return result
+
+    @staticmethod
+    def invalidate():
+        cache.set(VERSION_CACHE_KEY, time.time_ns(), None)
+
+
+ingredient_index = IngredientIndex()
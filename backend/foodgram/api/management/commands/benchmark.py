@@ -0,0 +1,128 @@
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from api.benchmarks import get_cases, seed_fixtures
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+def measure(case, repeat):
+    case()
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            case()
+            timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        case()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'time_ms': round(statistics.median(timings) * 1000, 3),
+        'queries': len(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Time serializers, filters and shopping cart rendering on seeded '
+        'fixtures and compare the results with a stored baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--recipes', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--baseline',
+            default=str(Path(settings.BASE_DIR) / 'benchmark_baseline.json'),
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Store the results as the new baseline',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.25,
+            help='Allowed relative slowdown or memory growth',
+        )
+        parser.add_argument(
+            '--only', help='Run the cases whose name contains this text'
+        )
+
+    def handle(self, *args, **options):
+        results = {}
+        with transaction.atomic():
+            fixtures = seed_fixtures(options['seed'], options['recipes'])
+            try:
+                for name, case in get_cases(fixtures).items():
+                    if options['only'] and options['only'] not in name:
+                        continue
+                    results[name] = measure(case, options['repeat'])
+                    self.stdout.write(
+                        '{:<36} {time_ms:>10.2f} ms {queries:>5} queries '
+                        '{peak_kb:>10.1f} KiB'.format(name, **results[name])
+                    )
+            finally:
+                transaction.set_rollback(True)
+                for name in fixtures.created_files:
+                    default_storage.delete(name)
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline = {}
+            if baseline_path.exists():
+                baseline = json.loads(baseline_path.read_text())
+            baseline.update(results)
+            baseline_path.write_text(json.dumps(baseline, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(
+                f'baseline saved to {baseline_path}'
+            ))
+            return
+        if not baseline_path.exists():
+            self.stdout.write(
+                'no baseline to compare with, run with --save-baseline'
+            )
+            return
+        regressions = self.compare(
+            json.loads(baseline_path.read_text()), results,
+            options['threshold'],
+        )
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            raise CommandError(f'{len(regressions)} regressions')
+        self.stdout.write(self.style.SUCCESS('no regressions'))
+
+    @staticmethod
+    def compare(baseline, results, threshold):
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            if result['queries'] > expected['queries']:
+                regressions.append(
+                    f'{name}: {result["queries"]} queries, '
+                    f'baseline {expected["queries"]}'
+                )
+            for metric in ('time_ms', 'peak_kb'):
+                limit = expected[metric] * (1 + threshold)
+                if result[metric] > limit:
+                    regressions.append(
+                        f'{name}: {metric} {result[metric]}, '
+                        f'baseline {expected[metric]}'
+                    )
+        return regressions
@@ -0,0 +1,64 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from foodgram.db.pool import get_pool_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent request-like checkouts against the database and '
+        'print the connection pool statistics of this process'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--threads', type=int, default=20)
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Checkouts per thread, each running one query',
+        )
+        parser.add_argument(
+            '--hold', type=float, default=0.01,
+            help='Seconds every checkout keeps its connection',
+        )
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if not hasattr(connections[alias], 'pool'):
+            raise CommandError(
+                f'Database {alias!r} is not pooled, set DB_POOL=True'
+            )
+        errors = []
+
+        def worker():
+            connection = connections[alias]
+            for _ in range(options['requests']):
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                    time.sleep(options['hold'])
+                except Exception as error:
+                    errors.append(error)
+                finally:
+                    connection.close()
+
+        started = time.monotonic()
+        threads = [
+            threading.Thread(target=worker)
+            for _ in range(options['threads'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'{options["threads"] * options["requests"]} checkouts in '
+            f'{elapsed:.2f}s, {len(errors)} errors'
+        )
+        for error in set(map(str, errors)):
+            self.stdout.write(self.style.ERROR(error))
+        for name, value in get_pool_stats()[alias].items():
+            self.stdout.write(f'{name}: {value}')
@@ -0,0 +1,202 @@
+import asyncio
+import statistics
+import time
+from itertools import cycle
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = ('/api/recipes/', '/api/tags/', '/api/ingredients/')
+
+
+class Target:
+    def __init__(self, spec):
+        label, _, url = spec.rpartition('=')
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise CommandError(f'Invalid target: {spec}')
+        self.label = label or parts.netloc
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = parts.scheme == 'https'
+        self.prefix = parts.path.rstrip('/')
+        self.netloc = parts.netloc
+
+
+class Connection:
+    """A keep-alive HTTP/1.1 connection speaking just enough protocol."""
+
+    def __init__(self, target, headers):
+        self.target = target
+        self.headers = headers
+        self.reader = self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(
+            self.target.host, self.target.port, ssl=self.target.ssl
+        )
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    def build_request(self, path):
+        lines = [
+            f'GET {self.target.prefix}{path} HTTP/1.1',
+            f'Host: {self.target.netloc}',
+            'Accept: application/json',
+            *self.headers,
+        ]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode()
+
+    async def request(self, path, pause=0):
+        """Send a GET and return the status; ``pause`` stalls mid-headers."""
+        if self.writer is None:
+            await self.open()
+        request = self.build_request(path)
+        if pause:
+            middle = request.index(b'\r\n') + 2
+            self.writer.write(request[:middle])
+            await self.writer.drain()
+            await asyncio.sleep(pause)
+            request = request[middle:]
+        self.writer.write(request)
+        await self.writer.drain()
+        return await self.read_response()
+
+    async def read_response(self):
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        status = int(status_line.split()[1])
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+        elif status not in (204, 304):
+            await self.reader.read()
+            self.close()
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status
+
+
+class Command(BaseCommand):
+    help = (
+        'Load running servers with concurrent keep-alive clients and '
+        'report throughput and latency percentiles of each, e.g. to '
+        'compare the WSGI and ASGI server profiles'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target',
+            action='append',
+            help='label=base URL of a server, may be repeated '
+                 '(default: local=http://127.0.0.1:8000)',
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            help='Path to request, may be repeated; requests cycle '
+                 'through the paths',
+        )
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument(
+            '--slow-clients',
+            type=int,
+            default=0,
+            help='Clients that keep stalling mid-request for --slow-pause '
+                 'seconds while the load runs, like clients on bad networks',
+        )
+        parser.add_argument('--slow-pause', type=float, default=1.0)
+        parser.add_argument('--token', help='Authenticate as this token')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--concurrency and --requests must be positive')
+        targets = [
+            Target(spec)
+            for spec in options['target'] or ['local=http://127.0.0.1:8000']
+        ]
+        headers = []
+        if options['token']:
+            headers.append(f'Authorization: Token {options["token"]}')
+        for target in targets:
+            result = asyncio.run(self.run(target, headers, options))
+            self.stdout.write(self.format_result(target, result))
+
+    async def run(self, target, headers, options):
+        paths = cycle(options['path'] or DEFAULT_PATHS)
+        remaining = options['requests']
+        latencies = []
+        errors = 0
+        slow_done = asyncio.Event()
+
+        async def client():
+            nonlocal remaining, errors
+            connection = Connection(target, headers)
+            while remaining > 0:
+                remaining -= 1
+                path = next(paths)
+                started = time.perf_counter()
+                try:
+                    status = await connection.request(path)
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    connection.close()
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if status >= 400:
+                    errors += 1
+            connection.close()
+
+        async def slow_client():
+            connection = Connection(target, headers)
+            while not slow_done.is_set():
+                try:
+                    await connection.request(
+                        next(paths), options['slow_pause']
+                    )
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    connection.close()
+                    await asyncio.sleep(options['slow_pause'])
+            connection.close()
+
+        slow_tasks = [
+            asyncio.create_task(slow_client())
+            for _ in range(options['slow_clients'])
+        ]
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            client() for _ in range(options['concurrency'])
+        ))
+        elapsed = time.perf_counter() - started
+        slow_done.set()
+        for task in slow_tasks:
+            task.cancel()
+        await asyncio.gather(*slow_tasks, return_exceptions=True)
+        return latencies, errors, elapsed
+
+    @staticmethod
+    def format_result(target, result):
+        latencies, errors, elapsed = result
+        line = (
+            f'{target.label}: {len(latencies)} responses, {errors} errors, '
+            f'{len(latencies) / elapsed:.1f} req/s'
+        )
+        if len(latencies) < 2:
+            return line
+        percentiles = statistics.quantiles(latencies, n=100)
+        return line + ', p50 {:.1f} ms, p95 {:.1f} ms, p99 {:.1f} ms'.format(
+            *(percentiles[index] * 1000 for index in (49, 94, 98))
+        )
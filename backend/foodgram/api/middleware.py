@@ -0,0 +1,142 @@
+"""Per-request SQL instrumentation.
+
+Enabled with ``SQL_INSTRUMENTATION``. Every query of a request is timed
+through ``connection.execute_wrapper``, so ``DEBUG`` is not needed.
+Queries run while a streaming response is consumed are not counted.
+"""
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+IN_LIST_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+SQL_PREVIEW_LENGTH = 200
+
+
+def fingerprint(sql):
+    """Identify a statement regardless of its parameters and IN lengths."""
+    return hashlib.sha1(
+        IN_LIST_RE.sub('(...)', sql).encode()
+    ).hexdigest()[:12]
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.statements = {}
+        self.slowest = (0.0, '')
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            key = fingerprint(sql)
+            self.count += 1
+            self.duration += elapsed
+            self.fingerprints[key] += 1
+            self.statements.setdefault(key, sql[:SQL_PREVIEW_LENGTH])
+            if elapsed > self.slowest[0]:
+                self.slowest = (elapsed, sql[:SQL_PREVIEW_LENGTH])
+
+    @property
+    def duplicates(self):
+        return {
+            key: count for key, count in self.fingerprints.most_common()
+            if count > 1
+        }
+
+
+class SQLInstrumentationMiddleware:
+    """Report query count, SQL time and duplicates of every request.
+
+    The numbers go to a ``Server-Timing`` header and a JSON log line,
+    logged as a warning when the request exceeds ``SQL_BUDGETS``.
+    Budgets are keyed by URL name with ``'default'`` as the fallback.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+        self.add_server_timing(response, recorder, total)
+        self.log(request, response, recorder, total)
+        return response
+
+    @staticmethod
+    def add_server_timing(response, recorder, total):
+        metrics = [
+            f'db;dur={recorder.duration * 1000:.1f};'
+            f'desc="{recorder.count} queries"',
+            f'app;dur={total * 1000:.1f}',
+        ]
+        if recorder.duplicates:
+            metrics.append(
+                f'dup;desc="{sum(recorder.duplicates.values())} '
+                f'duplicated queries"'
+            )
+        if response.has_header('Server-Timing'):
+            metrics.insert(0, response['Server-Timing'])
+        response['Server-Timing'] = ', '.join(metrics)
+
+    @staticmethod
+    def get_budget(view_name):
+        budgets = settings.SQL_BUDGETS
+        return {**budgets['default'], **budgets.get(view_name, {})}
+
+    def log(self, request, response, recorder, total):
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        budget = self.get_budget(view_name)
+        measured = {
+            'queries': recorder.count,
+            'sql_ms': round(recorder.duration * 1000, 1),
+            'duplicates': sum(recorder.duplicates.values()),
+        }
+        over_budget = [
+            name for name, value in measured.items()
+            if budget.get(name) is not None and value > budget[name]
+        ]
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            **measured,
+            'duplicated': [
+                {'fingerprint': key, 'count': count,
+                 'sql': recorder.statements[key]}
+                for key, count in list(recorder.duplicates.items())[:5]
+            ],
+            'slowest': {
+                'ms': round(recorder.slowest[0] * 1000, 1),
+                'sql': recorder.slowest[1],
+            },
+            'over_budget': over_budget,
+        }
+        logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            json.dumps(record, ensure_ascii=False),
+        )
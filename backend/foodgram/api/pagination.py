@@ -1,7 +1,221 @@
+import hashlib
+import time
+
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import InvalidPage, Paginator
+from django.db import transaction
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+KEYSET_ORDERINGS = (('-id',), ('-pk',))
+COUNT_GENERATION_CACHE_KEY = 'count_generation'
+
+
+def _count_cache_key(queryset, generation):
+    """Return the cache key of the count, ``None`` for an empty query."""
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return None
+    return 'count_{}_{}'.format(
+        generation, hashlib.sha1(repr((sql, params)).encode()).hexdigest()
+    )
+
+
+def invalidate_cached_counts():
+    """Drop all cached counts once the current transaction commits."""
+    transaction.on_commit(lambda: cache.set(
+        COUNT_GENERATION_CACHE_KEY, time.time_ns(), None
+    ))
+
+
+def get_cached_count(queryset):
+    """Count ``queryset``, reusing the result for identical queries."""
+    key = _count_cache_key(queryset, cache.get_or_set(
+        COUNT_GENERATION_CACHE_KEY, time.time_ns, None
+    ))
+    if key is None:
+        return 0
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+async def aget_cached_count(queryset):
+    key = _count_cache_key(queryset, await cache.aget_or_set(
+        COUNT_GENERATION_CACHE_KEY, time.time_ns, None
+    ))
+    if key is None:
+        return 0
+    count = await cache.aget(key)
+    if count is None:
+        count = await queryset.acount()
+        await cache.aset(
+            key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT
+        )
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        return get_cached_count(self.object_list)
 
 
 class CustomPageNumberPagination(PageNumberPagination):
+    """Page number pagination with an opt-in keyset mode.
+
+    Passing ``cursor`` (empty for the first page) switches querysets
+    ordered by ``-id`` to seeking on the primary key, so deep pages cost
+    the same as the first one. Cursor pages leave ``count`` empty, since
+    counting would scan what seeking avoids.
+    """
     page_size_query_param = 'limit'
     page_size = settings.MAX_PAGE_AMOUNT
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    cache_count = False
+
+    def get_count(self, queryset):
+        if self.cache_count:
+            return get_cached_count(queryset)
+        return queryset.count()
+
+    async def aget_count(self, queryset):
+        if self.cache_count:
+            return await aget_cached_count(queryset)
+        return await queryset.acount()
+
+    @staticmethod
+    def supports_keyset(queryset):
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        return tuple(ordering) in KEYSET_ORDERINGS
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = (
+            self.cursor_query_param in request.query_params
+            and self.supports_keyset(queryset)
+        )
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.count = None
+        page_size = self.get_page_size(request)
+        return self.trim_keyset_page(
+            list(self.seek(queryset, request)[:page_size + 1]), page_size
+        )
+
+    async def apaginate_queryset(self, queryset, request):
+        """Async ``paginate_queryset`` evaluated with the async ORM."""
+        self.request = request
+        self.keyset = (
+            self.cursor_query_param in request.query_params
+            and self.supports_keyset(queryset)
+        )
+        page_size = self.get_page_size(request)
+        if self.keyset:
+            self.count = None
+            page = [
+                obj async for obj in
+                self.seek(queryset, request)[:page_size + 1]
+            ]
+            return self.trim_keyset_page(page, page_size)
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await self.aget_count(queryset)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        bottom = (number - 1) * page_size
+        object_list = [
+            obj async for obj in queryset[bottom:bottom + page_size]
+        ]
+        self.page = paginator._get_page(object_list, number, paginator)
+        return object_list
+
+    def paginate_ids(self, request, get_ids):
+        """Keyset pagination over ids that do not come from one queryset.
+
+        ``get_ids(limit, before)`` returns up to ``limit`` ids lower than
+        ``before``, newest first. The total is not counted.
+        """
+        self.request = request
+        self.keyset = True
+        self.count = None
+        page_size = self.get_page_size(request)
+        ids = get_ids(page_size + 1, self.get_cursor(request))
+        self.next_cursor = None
+        if len(ids) > page_size:
+            ids = ids[:page_size]
+            self.next_cursor = ids[-1]
+        return ids
+
+    def get_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            return int(cursor)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def seek(self, queryset, request):
+        cursor = self.get_cursor(request)
+        if cursor is None:
+            return queryset
+        return queryset.filter(pk__lt=cursor)
+
+    def trim_keyset_page(self, page, page_size):
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = page[-1].pk
+        return page
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        return replace_query_param(
+            url, self.cursor_query_param, self.next_cursor
+        )
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        return None
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class CachedCountPagination(CustomPageNumberPagination):
+    """Reuses totals from a short-lived cache.
+
+    Cached counts are dropped when users are added or removed and when
+    recipes, favorites, carts or subscriptions change, see
+    ``invalidate_cached_counts``.
+    """
+    django_paginator_class = CachedCountPaginator
+    cache_count = True
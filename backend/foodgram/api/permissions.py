@@ -12,8 +12,8 @@ class AdminPermission(permissions.BasePermission):
 
 class IsAuthorOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        if request.user and request.user.is_authenticated:
-            return obj.author == request.user
         if request.method in permissions.SAFE_METHODS:
             return True
+        if request.user and request.user.is_authenticated:
+            return obj.author == request.user
         return False
@@ -1,11 +1,21 @@
 import users.models
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer
 from djoser.serializers import UserSerializer as DjoserUserSerializer
-from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from jobs.models import Job
+from jobs.registry import enqueue
+from recipes.models import (Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingListItem, Tag)
+from recipes.search import update_search_index
 from rest_framework import serializers
 
-from .fields import Base64ImageField
+from .cache import get_user_id_set
+from .fields import (Base64ImageField, BulkPrimaryKeyRelatedField,
+                     ImageRenditionsField)
+from .services import get_subscribed_author_ids
 
 User = get_user_model()
 
@@ -25,12 +35,11 @@ class UserSerializer(DjoserUserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return users.models.Subscribe.objects.filter(
-                user=request.user, author=obj
-            ).exists()
-        return False
+        return obj.id in get_subscribed_author_ids(request)
 
 
 class UserRegistrationSerializer(UserCreateSerializer):
@@ -107,15 +116,17 @@ class CreateIngredientInRecipeSerializer(serializers.ModelSerializer):
 class RecipeSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True)
     author = UserSerializer(read_only=True)
-    ingredients = CreateIngredientInRecipeSerializer(
+    ingredients = IngredientInRecipeSerializer(
         many=True,
-        write_only=True,
+        read_only=True,
+        source='ingredients_in_recipe',
     )
     is_favorite = serializers.BooleanField(
         read_only=True,
         default=False
     )
     image = Base64ImageField(max_length=None, use_url=True)
+    image_renditions = ImageRenditionsField()
     is_in_shopping_cart = serializers.BooleanField(
         read_only=True,
         default=False
@@ -132,6 +143,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_favorite',
             'name',
             'image',
+            'image_renditions',
             'text',
             'cooking_time',
         )
@@ -145,7 +157,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         many=True,
         write_only=True,
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True,
     )
@@ -175,7 +187,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         if not tags:
             raise serializers.ValidationError('no any tag')
 
-        if not data:
+        if not data.get('ingredients'):
             raise serializers.ValidationError(
                 'Add an ingredient'
             )
@@ -202,81 +214,193 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 'total weight of ingredients must be greater than 0'
             )
 
+        existing = Ingredient.objects.in_bulk(ingredients)
+        missing = sorted(ingredients - existing.keys())
+        if missing:
+            raise serializers.ValidationError({
+                'ingredients': [
+                    f'ingredient {ingredient_id} does not exist'
+                    for ingredient_id in missing
+                ]
+            })
+
         return data
 
     @staticmethod
     def create_ingredients(ingredients, recipe):
-        ingridientsinrecipe = []
-        for ingredientinfo in ingredients:
-            ingrinrecipe = IngredientInRecipe(
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
                 recipe=recipe,
-                ingredient=Ingredient.objects.get(id=ingredientinfo['id']),
-                amount=ingredientinfo['amount'])
-            ingridientsinrecipe.append(ingrinrecipe)
-        IngredientInRecipe.objects.bulk_create(ingridientsinrecipe)
+                ingredient_id=ingredientinfo['id'],
+                amount=ingredientinfo['amount'],
+            )
+            for ingredientinfo in ingredients
+        )
+
+    @staticmethod
+    def update_ingredients(ingredients, recipe):
+        """Write only the changed rows, return the old and new amounts."""
+        current = {
+            item.ingredient_id: item
+            for item in IngredientInRecipe.objects.filter(recipe=recipe)
+        }
+        old_amounts = {
+            ingredient_id: item.amount
+            for ingredient_id, item in current.items()
+        }
+        new_amounts = {
+            ingredientinfo['id']: ingredientinfo['amount']
+            for ingredientinfo in ingredients
+        }
+        to_update = []
+        for ingredient_id, amount in new_amounts.items():
+            item = current.get(ingredient_id)
+            if item is not None and item.amount != amount:
+                item.amount = amount
+                to_update.append(item)
+        IngredientInRecipe.objects.filter(
+            id__in=[
+                item.id for ingredient_id, item in current.items()
+                if ingredient_id not in new_amounts
+            ]
+        ).delete()
+        IngredientInRecipe.objects.bulk_update(to_update, ['amount'])
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in current
+        )
+        return old_amounts, new_amounts
 
     @staticmethod
-    def create_tags(tags, recipe):
-        for tag in tags:
-            recipe.tags.add(tag)
+    def save_renditions(recipe, image):
+        if image is not None:
+            enqueue('recipes.generate_renditions', recipe_id=recipe.id)
 
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=author, **validated_data)
-        self.create_tags(tags, recipe)
+        self.save_renditions(recipe, validated_data.get('image'))
+        recipe.tags.add(*tags)
         self.create_ingredients(ingredients, recipe)
+        update_search_index([recipe.id])
         return recipe
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
-        return RecipeSerializer(instance, context=context).data
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch(
+                'ingredients_in_recipe',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
+        data = RecipeSerializer(instance, context=context).data
+        if request is not None and request.user.is_authenticated:
+            data['is_favorite'] = instance.id in get_user_id_set(
+                request.user.id, 'favorites'
+            )
+            data['is_in_shopping_cart'] = instance.id in get_user_id_set(
+                request.user.id, 'shopping_carts'
+            )
+        return data
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        IngredientInRecipe.objects.filter(recipe=instance).delete()
-        self.create_tags(validated_data.pop('tags'), instance)
-        self.create_ingredients(validated_data.pop('ingredients'), instance)
-        return super().update(instance, validated_data)
+        instance.tags.set(validated_data.pop('tags'))
+        old_amounts, new_amounts = self.update_ingredients(
+            validated_data.pop('ingredients'), instance
+        )
+        ShoppingListItem.objects.change_recipe(
+            instance, old_amounts, new_amounts
+        )
+        instance = super().update(instance, validated_data)
+        self.save_renditions(instance, validated_data.get('image'))
+        update_search_index([instance.id])
+        return instance
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = (
+            'id',
+            'name',
+            'status',
+            'attempts',
+            'result',
+            'created',
+            'updated',
+        )
 
 
 class RecipeDetailShortSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='recipe.id')
     name = serializers.ReadOnlyField(source='recipe.name')
     image = Base64ImageField(source='recipe.image', read_only=True)
+    image_renditions = ImageRenditionsField(source='recipe.image_renditions')
     cooking_time = serializers.ReadOnlyField(source='recipe.cooking_time')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT,
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
 
 
 class SubscribeRecipeDetailShortSerializer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
     author = UserSerializer()
     recipes = SubscribeRecipeDetailShortSerializer(
-        many=True, source='author.recipes', read_only=True
+        many=True, source='author.recipes_preview', read_only=True
     )
-    recipes_count = serializers.SerializerMethodField(read_only=True)
-    id = serializers.EmailField(source='author.id')
-    first_name = serializers.EmailField(source='author.first_name')
-    last_name = serializers.EmailField(source='author.last_name')
-    username = serializers.EmailField(source='author.username')
-    email = serializers.EmailField(source='author.email')
+    recipes_count = serializers.ReadOnlyField(source='author.recipes_count')
+    id = serializers.ReadOnlyField(source='author.id')
+    first_name = serializers.ReadOnlyField(source='author.first_name')
+    last_name = serializers.ReadOnlyField(source='author.last_name')
+    username = serializers.ReadOnlyField(source='author.username')
+    email = serializers.ReadOnlyField(source='author.email')
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     @staticmethod
-    def get_recipes_count(obj):
-        return obj.author.recipes.count()
+    def get_is_subscribed(obj):
+        return True
 
     class Meta:
         model = users.models.Subscribe
-        fields = ('id', 'author', 'recipes', 'recipes_count')
+        fields = (
+            'id',
+            'email',
+            'username',
+            'first_name',
+            'last_name',
+            'is_subscribed',
+            'author',
+            'recipes',
+            'recipes_count',
+        )
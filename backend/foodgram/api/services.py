@@ -1,15 +1,332 @@
-from django.http import HttpResponse
+import csv
+import tempfile
+import uuid
+from itertools import islice
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import F, Prefetch
+from django.http import StreamingHttpResponse
+from recipes.models import Recipe, ShoppingListItem
+from users.models import Subscribe
 
-def get_shoping_cart_file(shopping_cart):
-    response = HttpResponse(content_type='text/plain')
-    response[
-        'Content-Disposition'
-    ] = 'attachment; filename="shopping_cart.txt"'
+from .cache import get_user_id_set
+from .fonts import get_pdf_font
+
+
+class Echo:
+    """File-like object handing written csv rows back to the caller."""
+
+    @staticmethod
+    def write(value):
+        return value
+
+
+def get_subscribed_author_ids(request):
+    """Return ids of authors followed by the request user.
+
+    The set is read from the cache once and kept on the request, so every
+    serializer rendering users within the same response shares it.
+    """
+    if request is None or not request.user.is_authenticated:
+        return frozenset()
+    author_ids = getattr(request, '_subscribed_author_ids', None)
+    if author_ids is None:
+        author_ids = get_user_id_set(request.user.id, 'subscriptions')
+        request._subscribed_author_ids = author_ids
+    return author_ids
+
+
+PDF_PAGE_WIDTH = 595
+PDF_PAGE_HEIGHT = 842
+PDF_MARGIN = 50
+PDF_FONT_SIZE = 11
+PDF_LEADING = 16
+PDF_LINES_PER_PAGE = (PDF_PAGE_HEIGHT - 2 * PDF_MARGIN) // PDF_LEADING
+# Objects written after the pages: the catalog, the page tree and the font.
+PDF_FIRST_PAGE_ID = 8
+# Six uppercase letters marking an embedded font as a subset.
+PDF_FONT_SUBSET_TAG = 'FOODGR'
+
+
+def _shopping_cart_lines(shopping_cart):
     for ingredient in shopping_cart:
         name = ingredient['ingredient__name']
         amount = ingredient['amount']
         unit = ingredient['ingredient__measurement_unit']
-        line = f"{name} — {amount} {unit}\n"
-        response.write(line)
+        yield name, amount, unit
+
+
+def _render_txt(shopping_cart):
+    for name, amount, unit in _shopping_cart_lines(shopping_cart):
+        yield f"{name} — {amount} {unit}\n"
+
+
+def _render_csv(shopping_cart):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for line in _shopping_cart_lines(shopping_cart):
+        yield writer.writerow(line)
+
+
+def _pdf_stream(data, extra=b''):
+    return b'<< /Length %d%b >>\nstream\n%b\nendstream' % (
+        len(data), extra, data
+    )
+
+
+def _pdf_font_objects(font, used_glyphs):
+    """Bodies of the font objects 3 to 7 for the glyphs of ``used_glyphs``.
+
+    The font is a subset of a TrueType file embedded as a composite font
+    addressed by glyph ids, with a ``ToUnicode`` map so the text can be
+    searched and copied.
+    """
+    name = f'/{PDF_FONT_SUBSET_TAG}+{font.name}'.encode()
+    glyph_ids = sorted(used_glyphs)
+    widths = b' '.join(
+        b'%d [%d]' % (glyph_id, font.width(glyph_id))
+        for glyph_id in glyph_ids
+    )
+    to_unicode = (
+        b'/CIDInit /ProcSet findresource begin 12 dict begin begincmap\n'
+        b'/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) '
+        b'/Supplement 0 >> def\n/CMapName /Adobe-Identity-UCS def\n'
+        b'/CMapType 2 def\n1 begincodespacerange <0000> <FFFF> '
+        b'endcodespacerange\n'
+    )
+    for start in range(0, len(glyph_ids), 100):
+        chunk = glyph_ids[start:start + 100]
+        to_unicode += b'%d beginbfchar\n%b\nendbfchar\n' % (
+            len(chunk),
+            b'\n'.join(
+                b'<%04X> <%b>' % (
+                    glyph_id,
+                    used_glyphs[glyph_id].encode('utf-16-be').hex().encode()
+                )
+                for glyph_id in chunk
+            ),
+        )
+    to_unicode += b'endcmap CMapName currentdict /CMap defineresource pop '
+    to_unicode += b'end end'
+    font_file = font.subset(glyph_ids)
+    bbox = b' '.join(b'%d' % font.scale(value) for value in font.bbox)
+    ascent, descent = font.scale(font.ascent), font.scale(font.descent)
+    return {
+        3: b'<< /Type /Font /Subtype /Type0 /BaseFont %b '
+           b'/Encoding /Identity-H /DescendantFonts [4 0 R] '
+           b'/ToUnicode 5 0 R >>' % name,
+        4: b'<< /Type /Font /Subtype /CIDFontType2 /BaseFont %b '
+           b'/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) '
+           b'/Supplement 0 >> /FontDescriptor 6 0 R /CIDToGIDMap /Identity '
+           b'/W [%b] >>' % (name, widths),
+        5: _pdf_stream(to_unicode),
+        6: b'<< /Type /FontDescriptor /FontName %b /Flags 32 /FontBBox [%b] '
+           b'/ItalicAngle 0 /Ascent %d /Descent %d /CapHeight %d /StemV 80 '
+           b'/FontFile2 7 0 R >>' % (name, bbox, ascent, descent, ascent),
+        7: _pdf_stream(font_file, b' /Length1 %d' % len(font_file)),
+    }
+
+
+def _render_pdf(shopping_cart):
+    # Load the font before the first chunk, so a missing font file fails
+    # the request instead of cutting a streamed response short.
+    return _write_pdf(shopping_cart, get_pdf_font())
+
+
+def _write_pdf(shopping_cart, font):
+    """Write a PDF document one page at a time.
+
+    The page tree and font objects are reserved up front and written
+    last, when all page ids and used glyphs are known, so no page has to
+    be kept in memory.
+    """
+    offsets = {}
+    position = 0
+    page_ids = []
+    used_glyphs = {}
+
+    def encode(text):
+        glyph_ids = []
+        for char in text:
+            glyph_id = font.glyph_id(char)
+            used_glyphs.setdefault(glyph_id, char)
+            glyph_ids.append(glyph_id)
+        return b''.join(b'%04X' % glyph_id for glyph_id in glyph_ids)
+
+    def write_object(object_id, body):
+        nonlocal position
+        offsets[object_id] = position
+        chunk = b'%d 0 obj\n%b\nendobj\n' % (object_id, body)
+        position += len(chunk)
+        return chunk
+
+    def write_page(lines):
+        object_id = max(offsets, default=PDF_FIRST_PAGE_ID - 1) + 1
+        content = b'BT /F1 %d Tf %d TL %d %d Td\n%b\nET' % (
+            PDF_FONT_SIZE, PDF_LEADING, PDF_MARGIN,
+            PDF_PAGE_HEIGHT - PDF_MARGIN,
+            b'\n'.join(b'<%b> Tj T*' % line for line in lines),
+        )
+        page_ids.append(object_id + 1)
+        return write_object(object_id, _pdf_stream(content)) + write_object(
+            object_id + 1,
+            b'<< /Type /Page /Parent 2 0 R /Resources << /Font '
+            b'<< /F1 3 0 R >> >> /MediaBox [0 0 %d %d] '
+            b'/Contents %d 0 R >>' % (
+                PDF_PAGE_WIDTH, PDF_PAGE_HEIGHT, object_id
+            )
+        )
+
+    header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+    position = len(header)
+    yield header
+    lines = []
+    for line in _render_txt(shopping_cart):
+        lines.append(encode(line.rstrip('\n')))
+        if len(lines) == PDF_LINES_PER_PAGE:
+            yield write_page(lines)
+            lines = []
+    if lines or not page_ids:
+        yield write_page(lines)
+    yield write_object(2, b'<< /Type /Pages /Kids [%b] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % page_id for page_id in page_ids),
+        len(page_ids),
+    ))
+    yield write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+    for object_id, body in _pdf_font_objects(font, used_glyphs).items():
+        yield write_object(object_id, body)
+    xref = b'xref\n0 %d\n0000000000 65535 f \n%b' % (
+        len(offsets) + 1,
+        b''.join(
+            b'%010d 00000 n \n' % offsets[object_id]
+            for object_id in sorted(offsets)
+        ),
+    )
+    trailer = b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+    yield xref + trailer % (len(offsets) + 1, position)
+
+
+SHOPPING_CART_RENDERERS = {
+    'txt': _render_txt,
+    'csv': _render_csv,
+    'pdf': _render_pdf,
+}
+
+
+def get_shopping_cart(user):
+    return ShoppingListItem.objects.filter(
+        user=user
+    ).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        amount=F('total_amount'),
+    ).order_by('ingredient__name')
+
+
+SHOPPING_CART_FILES_DIR = 'shopping_carts'
+
+
+def write_shopping_cart_file(user, file_format):
+    """Render the shopping list into storage and return the file name."""
+    chunks = SHOPPING_CART_RENDERERS[file_format](
+        get_shopping_cart(user).iterator(
+            chunk_size=settings.SHOPPING_CART_CHUNK_SIZE
+        )
+    )
+    name = f'{SHOPPING_CART_FILES_DIR}/{uuid.uuid4().hex}.{file_format}'
+    with tempfile.TemporaryFile() as file:
+        for chunk in chunks:
+            file.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        file.seek(0)
+        return default_storage.save(name, File(file))
+
+
+def delete_shopping_cart_files(before):
+    """Delete rendered shopping lists last modified before ``before``."""
+    try:
+        _, names = default_storage.listdir(SHOPPING_CART_FILES_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        name = f'{SHOPPING_CART_FILES_DIR}/{name}'
+        if default_storage.get_modified_time(name) < before:
+            default_storage.delete(name)
+
+
+async def _aiter_chunks(chunks):
+    """Hand a sync iterator to an ASGI server batch by batch.
+
+    Under ASGI Django reads a sync iterator of a streaming response into
+    memory before sending it. Batches are pulled in the request's sync
+    thread instead, where the database cursor of the iterator lives.
+    """
+    chunks = iter(chunks)
+    next_batch = sync_to_async(
+        lambda: list(islice(chunks, settings.SHOPPING_CART_CHUNK_SIZE))
+    )
+    while True:
+        batch = await next_batch()
+        if not batch:
+            return
+        for chunk in batch:
+            yield chunk
+
+
+def get_shoping_cart_file(shopping_cart, file_format='txt', content_type=None):
+    """Stream the shopping list, reading ingredients with a DB cursor."""
+    if hasattr(shopping_cart, 'iterator'):
+        shopping_cart = shopping_cart.iterator(
+            chunk_size=settings.SHOPPING_CART_CHUNK_SIZE
+        )
+    chunks = SHOPPING_CART_RENDERERS[file_format](shopping_cart)
+    if settings.SERVER_PROFILE == 'asgi':
+        chunks = _aiter_chunks(chunks)
+    response = StreamingHttpResponse(
+        chunks, content_type=content_type or 'text/plain'
+    )
+    response[
+        'Content-Disposition'
+    ] = f'attachment; filename="shopping_cart.{file_format}"'
     return response
+
+
+def get_recipes_limit(request):
+    """Parse the ``recipes_limit`` query parameter.
+
+    Missing or invalid values fall back to ``RECIPES_PREVIEW_LIMIT``.
+    """
+    try:
+        recipes_limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return settings.RECIPES_PREVIEW_LIMIT
+    return (
+        recipes_limit if recipes_limit > 0
+        else settings.RECIPES_PREVIEW_LIMIT
+    )
+
+
+def get_subscriptions(user, recipes_limit=None):
+    """Subscriptions of ``user`` with previewed recipes.
+
+    A sliced prefetch is evaluated by Django as a single query with
+    ``ROW_NUMBER()`` partitioned by author, so only the newest
+    ``recipes_limit`` recipes of each author are loaded, by default
+    ``RECIPES_PREVIEW_LIMIT``.
+    """
+    recipes = Recipe.objects.all()[
+        :recipes_limit or settings.RECIPES_PREVIEW_LIMIT
+    ]
+    return Subscribe.objects.filter(
+        user=user
+    ).select_related(
+        'author'
+    ).prefetch_related(
+        Prefetch(
+            'author__recipes',
+            queryset=recipes,
+            to_attr='recipes_preview'
+        )
+    ).order_by('-id')
@@ -0,0 +1,144 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from jobs.registry import enqueue
+from recipes.feed import remove_author
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag,
+                            get_ingredient_amounts)
+from rest_framework.authtoken.models import Token
+from users.models import Subscribe
+
+from .authentication import invalidate_tokens
+from .cache import (invalidate_blob, invalidate_recipe_fragments,
+                    invalidate_user_id_set)
+from .ingredient_index import ingredient_index
+from .pagination import invalidate_cached_counts
+
+User = get_user_model()
+
+
+def invalidate_recipes(recipe_ids):
+    """Drop cached fragments now and again once the transaction commits."""
+    recipe_ids = list(recipe_ids)
+    invalidate_recipe_fragments(recipe_ids)
+    transaction.on_commit(lambda: invalidate_recipe_fragments(recipe_ids))
+
+
+def invalidate_id_set(user_id, kind):
+    """Drop a cached id set now and again once the transaction commits."""
+    invalidate_user_id_set(user_id, kind)
+    transaction.on_commit(lambda: invalidate_user_id_set(user_id, kind))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    ingredient_index.invalidate()
+    invalidate_blob('ingredients')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    invalidate_blob('tags')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    invalidate_recipes([instance.id])
+
+
+@receiver((post_save, pre_delete), sender=User)
+def invalidate_author_recipes(instance, **kwargs):
+    invalidate_recipes(
+        Recipe.objects.filter(author=instance).values_list('id', flat=True)
+    )
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def invalidate_tag_recipes(instance, **kwargs):
+    invalidate_recipes(
+        Recipe.objects.filter(tags=instance).values_list('id', flat=True)
+    )
+
+
+@receiver((post_save, pre_delete), sender=Ingredient)
+def invalidate_ingredient_recipes(instance, **kwargs):
+    invalidate_recipes(
+        IngredientInRecipe.objects.filter(
+            ingredient=instance
+        ).values_list('recipe_id', flat=True)
+    )
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def invalidate_favorites(instance, **kwargs):
+    invalidate_id_set(instance.user_id, 'favorites')
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def invalidate_shopping_carts(instance, **kwargs):
+    invalidate_id_set(instance.user_id, 'shopping_carts')
+
+
+@receiver((post_save, post_delete), sender=Subscribe)
+def invalidate_subscriptions(instance, **kwargs):
+    invalidate_id_set(instance.user_id, 'subscriptions')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Subscribe)
+def invalidate_counts(**kwargs):
+    invalidate_cached_counts()
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_user_counts(created=True, **kwargs):
+    # Logins save the user too, only new and deleted users change counts.
+    if created:
+        invalidate_cached_counts()
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(instance, **kwargs):
+    # Also reached by admin and cascading deletes. The recipe row is
+    # locked first, in the order cart changes lock rows.
+    Recipe.objects.select_for_update().filter(pk=instance.pk).exists()
+    ShoppingListItem.objects.change_recipe(
+        instance, get_ingredient_amounts(instance), {}
+    )
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, **kwargs):
+    invalidate_tokens(
+        Token.objects.filter(user=instance).values_list('key', flat=True)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, **kwargs):
+    if created:
+        enqueue('recipes.fan_out_recipe', recipe_id=instance.id)
+
+
+@receiver(post_save, sender=Subscribe)
+def add_author_to_timeline(instance, created, **kwargs):
+    if created:
+        enqueue(
+            'recipes.backfill_timeline',
+            user_id=instance.user_id,
+            author_id=instance.author_id,
+        )
+
+
+@receiver(post_delete, sender=Subscribe)
+def remove_author_from_timeline(instance, **kwargs):
+    remove_author(instance.user_id, instance.author_id)
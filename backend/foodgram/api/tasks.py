@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from jobs.registry import task
+from recipes.feed import backfill_timeline, push_recipe
+from recipes.images import generate_renditions
+from recipes.models import Recipe
+from users.models import Subscribe
+
+from .services import delete_shopping_cart_files, write_shopping_cart_file
+
+User = get_user_model()
+
+
+@task('recipes.generate_renditions')
+def generate_recipe_renditions(recipe_id):
+    recipe = Recipe.objects.filter(id=recipe_id).first()
+    if recipe is None:
+        return None
+    generate_renditions(recipe)
+    return recipe.image_renditions
+
+
+@task('recipes.fan_out_recipe')
+def fan_out_recipe(recipe_id):
+    recipe = Recipe.objects.select_related('author').filter(
+        id=recipe_id
+    ).first()
+    if recipe is None:
+        return None
+    return {'pushed': push_recipe(recipe)}
+
+
+@task('recipes.backfill_timeline')
+def backfill_subscriber_timeline(user_id, author_id):
+    subscription = Subscribe.objects.select_related('author').filter(
+        user_id=user_id, author_id=author_id
+    ).first()
+    if subscription is None:
+        return None
+    backfill_timeline(user_id, subscription.author)
+    return {'user': user_id, 'author': author_id}
+
+
+@task('recipes.render_shopping_cart', purge=delete_shopping_cart_files)
+def render_shopping_cart(user_id, file_format):
+    name = write_shopping_cart_file(User.objects.get(id=user_id), file_format)
+    return {'file': default_storage.url(name)}
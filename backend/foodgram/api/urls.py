@@ -1,4 +1,5 @@
-from api import views
+from api import async_views, views
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
@@ -13,9 +14,36 @@ router_v1.register(
     views.IngredientViewSet,
     basename='ingredients'
 )
+router_v1.register('jobs', views.JobViewSet, basename='jobs')
 
 urlpatterns = [
     path('', include(router_v1.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
+    path(
+        'auth/token-cache/',
+        views.TokenCacheStatsView.as_view(),
+        name='token-cache',
+    ),
+    path('db-pool/', views.DatabasePoolView.as_view(), name='db-pool'),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    sync_views = {
+        pattern.name: pattern.callback
+        for pattern in router_v1.urls if pattern.name
+    }
+    async_read_views = (
+        ('recipes/', async_views.recipe_list, 'recipes-list'),
+        ('recipes/<int:pk>/', async_views.recipe_detail, 'recipes-detail'),
+        ('ingredients/', async_views.ingredient_list, 'ingredients-list'),
+        ('tags/', async_views.tag_list, 'tags-list'),
+    )
+    urlpatterns = [
+        path(
+            route,
+            async_views.with_sync_fallback(view, sync_views[name]),
+            name=name,
+        )
+        for route, view, name in async_read_views
+    ] + urlpatterns
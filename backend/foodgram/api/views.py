@@ -1,23 +1,39 @@
+import os
+
 import users.models
 from django.contrib.auth import get_user_model
-from django.db.models import Exists, OuterRef, Sum
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
 from django_filters import rest_framework as filters
 from djoser.views import UserViewSet
+from foodgram.db.pool import get_pool_stats
+from jobs.models import Job
+from jobs.registry import enqueue
+from recipes.feed import get_feed_recipe_ids
 from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
                             ShoppingCart, Tag)
 from rest_framework import generics, mixins, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.filters import SearchFilter
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from .authentication import token_cache_stats
+from .cache import (apply_recipe_overlay, blob_response, get_blob,
+                    get_recipe_fragments, invalidate_user_id_set)
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPageNumberPagination
-from .permissions import IsAuthorOrReadOnly
-from .serializers import (IngredientSerializer,
+from .ingredient_index import ingredient_index
+from .pagination import CachedCountPagination, invalidate_cached_counts
+from .permissions import AdminPermission, IsAuthorOrReadOnly
+from .renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
+from .serializers import (IngredientSerializer, JobSerializer,
                           RecipeCreateSerializer, RecipeDetailShortSerializer,
-                          RecipeSerializer, SubscribeSerializer, TagSerializer,
+                          RecipeIdsSerializer, RecipeSerializer,
+                          SubscribeSerializer, TagSerializer,
                           SubscriptionSerializer)
-from .services import get_shoping_cart_file
+from .services import (SHOPPING_CART_RENDERERS, get_recipes_limit,
+                       get_shoping_cart_file, get_shopping_cart,
+                       get_subscriptions)
 
 User = get_user_model()
 
@@ -28,6 +44,7 @@ class SubscribtionViewSet(
     viewsets.GenericViewSet
 ):
     serializer = SubscribeSerializer
+    pagination_class = CachedCountPagination
 
     @action(detail=True, methods=['POST', 'DELETE'])
     def subscribe(self, request, id):
@@ -56,10 +73,8 @@ class SubscribtionViewSet(
         methods=["GET"]
     )
     def subscriptions(self, request):
-        queryset = users.models.Subscribe.objects.filter(
-            user=request.user
-        ).select_related(
-            'author'
+        queryset = get_subscriptions(
+            request.user, get_recipes_limit(request)
         )
         page = self.paginate_queryset(queryset)
         serializer = SubscriptionSerializer(
@@ -77,19 +92,50 @@ class RecipeViewSet(viewsets.ModelViewSet):
         IsAuthorOrReadOnly,
         permissions.IsAuthenticatedOrReadOnly
     )
-    pagination_class = CustomPageNumberPagination
+    pagination_class = CachedCountPagination
+
+    @staticmethod
+    def _get_recipes_queryset():
+        return Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredients_in_recipe',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
 
     def get_queryset(self):
-        if self.request.user.is_authenticated:
-            return Recipe.objects.annotate(
-                is_favorite=Exists(
-                    Recipe.objects.filter(
-                        author=self.request.user, id=OuterRef('id'))),
-                is_in_shopping_cart=Exists(
-                    ShoppingCart.objects.filter(
-                        user=self.request.user,
-                        recipe=OuterRef('id')))
-            ).select_related('author').all()
+        return self._get_recipes_queryset()
+
+    @classmethod
+    def _render_recipes(cls, recipe_ids):
+        queryset = cls._get_recipes_queryset().filter(id__in=recipe_ids)
+        return RecipeSerializer(queryset, many=True).data
+
+    def _get_recipes_data(self, recipe_ids):
+        return apply_recipe_overlay(
+            self.request,
+            get_recipe_fragments(recipe_ids, self._render_recipes)
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(Recipe.objects.only('id'))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            page = queryset
+        data = self._get_recipes_data([recipe.id for recipe in page])
+        if self.paginator is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = get_object_or_404(
+            Recipe.objects.only('id', 'author_id'), pk=kwargs['pk']
+        )
+        self.check_object_permissions(request, instance)
+        return Response(self._get_recipes_data([instance.id])[0])
 
     @staticmethod
     def _create_or_delete_item(request, recipe, model, serializer):
@@ -108,6 +154,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 )
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def _bulk_change_items(request, model, kind):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            statuses = model.objects.add_recipes(request.user.id, recipe_ids)
+        else:
+            statuses = model.objects.remove_recipes(
+                request.user.id, recipe_ids
+            )
+        invalidate_user_id_set(request.user.id, kind)
+        invalidate_cached_counts()
+        return Response({'results': [
+            {'id': recipe_id, 'status': statuses[recipe_id]}
+            for recipe_id in recipe_ids
+        ]})
+
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PATCH'):
             return RecipeCreateSerializer
@@ -140,19 +204,81 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(
         detail=False,
         methods=['get'],
-        permission_classes=[permissions.IsAuthenticatedOrReadOnly]
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def feed(self, request):
+        recipe_ids = self.paginator.paginate_ids(
+            request,
+            lambda limit, before: get_feed_recipe_ids(
+                request.user, limit, before
+            ),
+        )
+        return self.get_paginated_response(
+            self._get_recipes_data(recipe_ids)
+        )
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='favorite',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def favorite_bulk(self, request):
+        return self._bulk_change_items(request, Favorite, 'favorites')
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='shopping_cart',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def shopping_cart_bulk(self, request):
+        return self._bulk_change_items(
+            request, ShoppingCart, 'shopping_carts'
+        )
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=[PlainTextRenderer, CSVRenderer, PDFRenderer],
     )
     def download_shopping_cart(self, request):
-        shopping_cart = (
-            IngredientInRecipe.objects.filter(
-                recipe__shopping_carts__user=request.user
+        shopping_cart = get_shopping_cart(request.user)
+        renderer = request.accepted_renderer
+        return get_shoping_cart_file(
+            shopping_cart, renderer.format, renderer.media_type
+        )
+
+    @action(
+        detail=False,
+        methods=['post'],
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def shopping_cart_file(self, request):
+        file_format = request.data.get('format', 'txt')
+        if file_format not in SHOPPING_CART_RENDERERS:
+            return Response(
+                {'format': [f'Unsupported format: {file_format}']},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(amount=Sum('amount'))
-            .order_by('ingredient__name')
+        job = enqueue(
+            'recipes.render_shopping_cart',
+            user=request.user,
+            user_id=request.user.id,
+            file_format=file_format,
+        )
+        return Response(
+            JobSerializer(job).data, status=status.HTTP_202_ACCEPTED
         )
 
-        return get_shoping_cart_file(shopping_cart)
+
+class JobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
 
 
 class ShoppingListViewSet(viewsets.ModelViewSet):
@@ -167,12 +293,13 @@ class SubscriptionListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.DjangoFilterBackend, SearchFilter]
     filterset_fields = ['author__username']
-    pagination_class = CustomPageNumberPagination
+    pagination_class = CachedCountPagination
+    serializer_class = SubscriptionSerializer
 
     def get_queryset(self):
-        return users.models.Subscribe.objects.filter(
-            user=self.request.user
-        ).select_related('author')
+        return get_subscriptions(
+            self.request.user, get_recipes_limit(self.request)
+        )
 
 
 class IngredientViewSet(viewsets.ModelViewSet):
@@ -181,14 +308,45 @@ class IngredientViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.DjangoFilterBackend]
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return blob_response(request, get_blob(
+            'ingredients',
+            lambda: self.get_serializer(self.get_queryset(), many=True).data
+        ))
+
 
 class TagViewSet(viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
+    def list(self, request, *args, **kwargs):
+        return blob_response(request, get_blob(
+            'tags',
+            lambda: self.get_serializer(self.get_queryset(), many=True).data
+        ))
+
 
 class FavoriteViewSet(viewsets.ModelViewSet):
     serializer_class = RecipeDetailShortSerializer
 
     def get_queryset(self):
         return Favorite.objects.filter(user=self.request.user)
+
+
+class DatabasePoolView(APIView):
+    """Connection pool statistics of the worker process serving the call."""
+    permission_classes = [AdminPermission]
+
+    def get(self, request):
+        return Response({'pid': os.getpid(), 'pools': get_pool_stats()})
+
+
+class TokenCacheStatsView(APIView):
+    """Token cache counters of the worker process serving the call."""
+    permission_classes = [AdminPermission]
+
+    def get(self, request):
+        return Response({'pid': os.getpid(), **token_cache_stats})
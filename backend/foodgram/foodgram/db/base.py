@@ -0,0 +1,65 @@
+"""PostgreSQL backend that checks connections out of a pool.
+
+Selected with ``DB_POOL=True``. The pool lives in each worker process
+and is configured by the ``POOL`` dict of the database settings, see
+``foodgram.db.pool.DEFAULTS``. Closing a connection, which Django does
+at the end of every request with ``CONN_MAX_AGE = 0``, returns it to
+the pool instead of ending the PostgreSQL session.
+"""
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from django.utils.asyncio import async_unsafe
+
+from .pool import ConnectionPool, PoolTimeout, get_pool
+
+# TRANSACTION_STATUS_IDLE in psycopg2, TransactionStatus.IDLE in psycopg 3.
+TRANSACTION_IDLE = 0
+
+
+def check_connection(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    if not connection.autocommit:
+        connection.rollback()
+
+
+def reset_connection(connection):
+    if connection.info.transaction_status != TRANSACTION_IDLE:
+        connection.rollback()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def pool(self):
+        return get_pool(self.alias, lambda: ConnectionPool(
+            check=check_connection,
+            reset=reset_connection,
+            **self.settings_dict.get('POOL', {}),
+        ))
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        try:
+            connection = self.pool.checkout(
+                lambda: super(DatabaseWrapper, self).get_new_connection(
+                    conn_params
+                )
+            )
+        except PoolTimeout as error:
+            raise self.Database.OperationalError(str(error)) from error
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get(
+                'isolation_level', IsolationLevel.READ_COMMITTED
+            )
+        )
+        return connection
+
+    @async_unsafe
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.in_atomic_block:
+            # Django holds on to the connection until the block exits.
+            self.pool.discard(self.connection)
+        else:
+            self.pool.checkin(self.connection)
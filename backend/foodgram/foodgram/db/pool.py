@@ -0,0 +1,255 @@
+import os
+import threading
+import time
+from collections import Counter, deque
+
+DEFAULTS = {
+    'MIN_SIZE': 0,
+    'MAX_SIZE': 10,
+    'TIMEOUT': 5.0,
+    'MAX_IDLE': 300.0,
+    'MAX_LIFETIME': 3600.0,
+    'CHECK_AFTER': 30.0,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections.
+
+    ``connect`` opens a connection, ``check`` raises if a connection is
+    broken and ``reset`` prepares a returned one for reuse. Connections
+    idle for more than ``CHECK_AFTER`` seconds are checked on checkout,
+    idle ones above ``MIN_SIZE`` are closed after ``MAX_IDLE`` seconds
+    and every connection is replaced after ``MAX_LIFETIME`` seconds.
+    Checkouts wait up to ``TIMEOUT`` seconds when ``MAX_SIZE`` are in
+    use. Nothing here is database specific, so any object with a
+    ``close`` method can stand in for a connection.
+    """
+
+    def __init__(self, connect=None, check=None, reset=None, **config):
+        self.connect = connect
+        self.check = check
+        self.reset = reset
+        self.config = {**DEFAULTS, **config}
+        self.pid = os.getpid()
+        self._condition = threading.Condition()
+        self._idle = deque()
+        self._waiters = deque()
+        self._opened_at = {}
+        self._size = 0
+        self._filled = False
+        self.counters = Counter()
+
+    def checkout(self, connect=None):
+        """Return a pooled connection; ``connect`` overrides the factory."""
+        connect = connect or self.connect
+        self._fill(connect)
+        deadline = time.monotonic() + self.config['TIMEOUT']
+        ticket = None
+        expired = []
+        try:
+            with self._condition:
+                self.counters['checkouts'] += 1
+                expired.extend(self._pop_expired())
+                while True:
+                    if not self._waiters or self._waiters[0] is ticket:
+                        if self._idle:
+                            connection, released_at = self._idle.pop()
+                            break
+                        if self._size < self.config['MAX_SIZE']:
+                            self._size += 1
+                            connection = released_at = None
+                            break
+                    if ticket is None:
+                        # Waiters are served first come, first served.
+                        ticket = object()
+                        wait_started = time.monotonic()
+                        self._waiters.append(ticket)
+                        self.counters['waits'] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._waiters = deque(
+                            waiter for waiter in self._waiters
+                            if waiter is not ticket
+                        )
+                        self._condition.notify_all()
+                        self.counters['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'No connection available in '
+                            f'{self.config["TIMEOUT"]}s, '
+                            f'{self.config["MAX_SIZE"]} in use'
+                        )
+                    self._condition.wait(remaining)
+                if ticket is not None:
+                    self._waiters.popleft()
+                    self._condition.notify_all()
+                    self.counters['wait_ms'] += round(
+                        (time.monotonic() - wait_started) * 1000
+                    )
+        finally:
+            self._close_all(expired)
+        if connection is None:
+            return self._open(connect)
+        if not self._is_healthy(connection, released_at):
+            self._close_all([connection])
+            with self._condition:
+                self.counters['health_check_failures'] += 1
+                self._opened_at.pop(connection, None)
+            return self._open(connect)
+        return connection
+
+    def checkin(self, connection):
+        if self.reset is not None and not self._is_closed(connection):
+            try:
+                self.reset(connection)
+            except Exception:
+                self.discard(connection)
+                return
+        now = time.monotonic()
+        with self._condition:
+            opened_at = self._opened_at.get(connection, now)
+            if (
+                self._is_closed(connection)
+                or now - opened_at > self.config['MAX_LIFETIME']
+            ):
+                self.counters['recycled'] += 1
+                retired = [connection]
+                self._forget(connection)
+            else:
+                self._idle.append((connection, now))
+                retired = []
+            self._condition.notify_all()
+        self._close_all(retired)
+
+    def discard(self, connection):
+        """Close a checked out connection instead of returning it."""
+        self._close_all([connection])
+        with self._condition:
+            self._forget(connection)
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            connections = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            for connection in connections:
+                self._forget(connection)
+        self._close_all(connections)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.config['MIN_SIZE'],
+                'max_size': self.config['MAX_SIZE'],
+                **{
+                    name: self.counters[name] for name in (
+                        'checkouts', 'waits', 'wait_ms', 'timeouts',
+                        'opened', 'recycled', 'health_check_failures',
+                    )
+                },
+            }
+
+    def _fill(self, connect):
+        """Open ``MIN_SIZE`` connections on the first checkout."""
+        if self._filled:
+            return
+        with self._condition:
+            if self._filled:
+                return
+            self._filled = True
+            missing = max(self.config['MIN_SIZE'] - self._size, 0)
+            self._size += missing
+        for opened in range(missing):
+            try:
+                connection = self._open(connect)
+            except Exception:
+                with self._condition:
+                    self._size -= missing - opened - 1
+                raise
+            self.checkin(connection)
+
+    def _open(self, connect):
+        try:
+            connection = connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify_all()
+            raise
+        with self._condition:
+            self._opened_at[connection] = time.monotonic()
+            self.counters['opened'] += 1
+        return connection
+
+    def _forget(self, connection):
+        self._opened_at.pop(connection, None)
+        self._size -= 1
+
+    def _pop_expired(self):
+        """Take connections idle for too long off the pool, oldest first."""
+        expired = []
+        now = time.monotonic()
+        while (
+            self._idle
+            and self._size > self.config['MIN_SIZE']
+            and now - self._idle[0][1] > self.config['MAX_IDLE']
+        ):
+            connection, _ = self._idle.popleft()
+            self._forget(connection)
+            expired.append(connection)
+        self.counters['recycled'] += len(expired)
+        return expired
+
+    def _is_healthy(self, connection, released_at):
+        if self._is_closed(connection):
+            return False
+        if (
+            self.check is None
+            or time.monotonic() - released_at < self.config['CHECK_AFTER']
+        ):
+            return True
+        try:
+            self.check(connection)
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def _is_closed(connection):
+        return bool(getattr(connection, 'closed', False))
+
+    @staticmethod
+    def _close_all(connections):
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+
+def get_pool(alias, factory):
+    """Return the pool of database ``alias`` in this process.
+
+    Pools are not shared with forked processes, which get their own.
+    """
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[alias] = factory()
+        return pool
+
+
+def get_pool_stats():
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
@@ -0,0 +1,21 @@
+class DenormalizedFieldsMixin:
+    """Keeps columns maintained by queryset updates out of full saves.
+
+    Fields in ``denormalized_fields`` (counters changed with ``F()``,
+    values filled in by background tasks) are written only by explicit
+    ``update()`` calls or ``save(update_fields=...)``. A plain ``save()``
+    of an existing row leaves them alone, so it cannot write values
+    loaded earlier back over changes made since.
+    """
+    denormalized_fields = ()
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is None and not self._state.adding:
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.denormalized_fields
+                and field.attname not in deferred
+            ]
+        return super().save(*args, update_fields=update_fields, **kwargs)
@@ -24,6 +24,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'rest_framework.authtoken',
     'rest_framework',
@@ -33,9 +34,11 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.SQLInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,9 +70,11 @@ TEMPLATES = [
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 
+DB_POOL = os.getenv('DB_POOL', default='') == 'True'
+
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv(
+        'ENGINE': 'foodgram.db' if DB_POOL else os.getenv(
             'DB_ENGINE',
             default='django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', default='postgres'),
@@ -77,6 +82,33 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='localhost'),
         'PORT': os.getenv('DB_PORT', default='5432'),
+        'POOL': {
+            'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', default=1)),
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', default=10)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default=5)),
+            'MAX_IDLE': float(os.getenv('DB_POOL_MAX_IDLE', default=300)),
+            'MAX_LIFETIME': float(
+                os.getenv('DB_POOL_MAX_LIFETIME', default=3600)
+            ),
+            'CHECK_AFTER': float(
+                os.getenv('DB_POOL_CHECK_AFTER', default=30)
+            ),
+        },
+    }
+}
+
+# Signals invalidate cached data only in the process that changes it, so
+# every gunicorn worker and the job worker must share one cache, e.g.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache with
+# CACHE_LOCATION=redis://redis:6379/0. The default LocMemCache is only
+# correct for a single process such as runserver; gunicorn refuses to
+# start several workers and runjobs refuses to run on it.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
     }
 }
 
@@ -119,7 +151,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 }
 
@@ -131,10 +163,76 @@ MEDIA_URL = '/backend_media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'backend_media')
 AUTH_USER_MODEL = 'users.User'
 MAX_PAGE_AMOUNT = 6
+# Recipes previewed per author in subscriptions without ``recipes_limit``,
+# as many as the frontend shows.
+RECIPES_PREVIEW_LIMIT = 3
+PAGINATION_COUNT_CACHE_TIMEOUT = 30
+SHOPPING_CART_CHUNK_SIZE = 500
+# TrueType font with Cyrillic glyphs embedded into PDF shopping lists.
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+BULK_RECIPES_LIMIT = 100
+FEED_LENGTH = 500
+FEED_TRIM_SLACK = 50
+FEED_FANOUT_LIMIT = 10000
+FEED_FANOUT_BATCH = 1000
+INGREDIENT_INDEX_TTL = 300
+RECIPE_SEARCH_CONFIG = 'russian'
+REFERENCE_DATA_CACHE_TIMEOUT = 60 * 60
+RECIPE_CACHE_TIMEOUT = 60 * 60
+AUTH_TOKEN_CACHE_TIMEOUT = 5 * 60
+IMAGE_RENDITIONS = {
+    'thumbnail': (320, 320),
+    'medium': (800, 800),
+}
+IMAGE_SAVE_OPTIONS = {'quality': 85, 'optimize': True}
+
+JOBS_ALWAYS_EAGER = os.getenv('JOBS_ALWAYS_EAGER', default='') == 'True'
+JOBS_CONCURRENCY = 4
+JOBS_POLL_INTERVAL = 1.0
+JOBS_VISIBILITY_TIMEOUT = 300
+JOBS_MAX_ATTEMPTS = 3
+JOBS_RETRY_DELAY = 5
+# Finished jobs and their files are deleted after JOBS_RETENTION seconds,
+# checked by runjobs every JOBS_PURGE_INTERVAL seconds.
+JOBS_RETENTION = 7 * 24 * 60 * 60
+JOBS_PURGE_INTERVAL = 60 * 60
+
+SERVER_PROFILE = os.getenv('SERVER_PROFILE', default='wsgi')
+ASYNC_READ_VIEWS = os.getenv(
+    'ASYNC_READ_VIEWS', default=str(SERVER_PROFILE == 'asgi')
+) == 'True'
+
+SQL_INSTRUMENTATION = os.getenv('SQL_INSTRUMENTATION', default='') == 'True'
+SQL_BUDGETS = {
+    'default': {'queries': 20, 'sql_ms': 200, 'duplicates': 0},
+    'api:recipes-list': {'queries': 10},
+    'api:recipes-detail': {'queries': 6},
+    'api:users-subscriptions': {'queries': 6},
+    'api:users-list': {'queries': 6},
+    'api:users-me': {'queries': 4},
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.middleware': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
 
 DJOSER = {
     'PASSWORD_RESET_CONFIRM_URL':
         'api/users/reset_password_confirm/?uid={uid}&token={token}',
     'PASSWORD_RESET_CONFIRM_RETYPE':
         True,
+    'SERIALIZERS': {
+        'user': 'api.serializers.UserSerializer',
+        'current_user': 'api.serializers.UserSerializer',
+    },
 }
@@ -0,0 +1,143 @@
+from itertools import count
+from unittest import mock
+
+from django.test import SimpleTestCase
+from foodgram.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.numbers = count(1)
+        self.opened = []
+        self.clock = FakeClock()
+        patcher = mock.patch('foodgram.db.pool.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def connect(self):
+        connection = FakeConnection(next(self.numbers))
+        self.opened.append(connection)
+        return connection
+
+    def make_pool(self, check=None, reset=None, **config):
+        return ConnectionPool(self.connect, check, reset, **config)
+
+    def test_checkin_returns_connection_for_reuse(self):
+        pool = self.make_pool()
+        connection = pool.checkout()
+        pool.checkin(connection)
+        self.assertIs(pool.checkout(), connection)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(pool.stats()['in_use'], 1)
+
+    def test_min_size_is_opened_on_first_checkout(self):
+        pool = self.make_pool(MIN_SIZE=2)
+        pool.checkout()
+        self.assertEqual(len(self.opened), 2)
+        self.assertEqual(pool.stats()['idle'], 1)
+
+    def test_checkout_times_out_at_max_size(self):
+        pool = self.make_pool(MAX_SIZE=2, TIMEOUT=0)
+        first = pool.checkout()
+        pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        self.assertEqual(len(self.opened), 2)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+        pool.checkin(first)
+        self.assertIs(pool.checkout(), first)
+
+    def test_broken_connection_is_replaced_on_checkout(self):
+        def check(connection):
+            if connection.number == 1:
+                raise ConnectionError('server closed the connection')
+
+        pool = self.make_pool(check=check, CHECK_AFTER=0)
+        broken = pool.checkout()
+        pool.checkin(broken)
+        connection = pool.checkout()
+        self.assertIsNot(connection, broken)
+        self.assertTrue(broken.closed)
+        self.assertEqual(pool.stats()['health_check_failures'], 1)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_check_is_skipped_for_recently_used_connection(self):
+        check = mock.Mock(side_effect=ConnectionError)
+        pool = self.make_pool(check=check, CHECK_AFTER=30)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        self.clock.now += 10
+        self.assertIs(pool.checkout(), connection)
+        check.assert_not_called()
+
+    def test_closed_connection_is_not_returned_to_pool(self):
+        pool = self.make_pool()
+        connection = pool.checkout()
+        connection.close()
+        pool.checkin(connection)
+        self.assertEqual(pool.stats()['size'], 0)
+        self.assertEqual(pool.stats()['recycled'], 1)
+        self.assertIsNot(pool.checkout(), connection)
+
+    def test_discard_frees_a_slot(self):
+        pool = self.make_pool(MAX_SIZE=1, TIMEOUT=0)
+        connection = pool.checkout()
+        pool.discard(connection)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.checkout(), connection)
+
+    def test_failed_reset_discards_connection(self):
+        def reset(connection):
+            raise ConnectionError('rollback failed')
+
+        pool = self.make_pool(reset=reset)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_connection_is_recycled_after_max_lifetime(self):
+        pool = self.make_pool(MAX_LIFETIME=60)
+        connection = pool.checkout()
+        self.clock.now += 61
+        pool.checkin(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['recycled'], 1)
+        self.assertIsNot(pool.checkout(), connection)
+
+    def test_idle_connections_above_min_size_expire(self):
+        pool = self.make_pool(MIN_SIZE=1, MAX_IDLE=60)
+        first = pool.checkout()
+        second = pool.checkout()
+        pool.checkin(first)
+        pool.checkin(second)
+        self.clock.now += 61
+        self.assertIs(pool.checkout(), second)
+        self.assertTrue(first.closed)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_open_failure_frees_the_slot(self):
+        pool = ConnectionPool(
+            mock.Mock(side_effect=ConnectionError), MAX_SIZE=1, TIMEOUT=0
+        )
+        with self.assertRaises(ConnectionError):
+            pool.checkout()
+        self.assertEqual(pool.stats()['size'], 0)
+        self.assertIsInstance(pool.checkout(self.connect), FakeConnection)
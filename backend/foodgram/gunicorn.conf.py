@@ -0,0 +1,20 @@
+import os
+
+bind = '0:8000'
+
+if os.getenv('SERVER_PROFILE', default='wsgi') == 'asgi':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+
+
+def on_starting(server):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    from api.checks import is_cache_shared
+
+    if server.cfg.workers > 1 and not is_cache_shared():
+        raise RuntimeError(
+            'Several workers need a shared cache, set CACHE_BACKEND '
+            '(see CACHES in foodgram/settings.py)'
+        )
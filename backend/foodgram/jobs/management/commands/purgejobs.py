@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from jobs.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Delete finished jobs and the files they left behind'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention', type=int, default=settings.JOBS_RETENTION,
+            help='Keep jobs finished within this many seconds',
+        )
+
+    def handle(self, *args, **options):
+        deleted = Job.purge(options['retention'])
+        self.stdout.write(self.style.SUCCESS(f'deleted {deleted} jobs'))
@@ -0,0 +1,94 @@
+import logging
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api.checks import is_cache_shared
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.JOBS_CONCURRENCY
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=settings.JOBS_POLL_INTERVAL,
+        )
+        parser.add_argument(
+            '--visibility-timeout', type=int,
+            default=settings.JOBS_VISIBILITY_TIMEOUT,
+        )
+        parser.add_argument(
+            '--purge-interval', type=float,
+            default=settings.JOBS_PURGE_INTERVAL,
+            help='Seconds between purges of old finished jobs, 0 disables',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once the queue is empty',
+        )
+
+    def handle(self, *args, **options):
+        if not is_cache_shared():
+            # Tasks invalidate cached recipes, which the web processes
+            # would never see in a cache of this process.
+            raise CommandError(
+                'The worker needs a cache shared with the web processes, '
+                'set CACHE_BACKEND (see CACHES in foodgram/settings.py)'
+            )
+        self.stopping = threading.Event()
+        self.purge_lock = threading.Lock()
+        self.purged_at = None
+        signal.signal(signal.SIGTERM, lambda *args: self.stopping.set())
+        signal.signal(signal.SIGINT, lambda *args: self.stopping.set())
+        concurrency = options['concurrency']
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            workers = [
+                executor.submit(self.work, options)
+                for _ in range(concurrency)
+            ]
+            for worker in workers:
+                worker.result()
+        self.stdout.write(self.style.SUCCESS('worker stopped'))
+
+    def work(self, options):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                job = Job.claim_next(options['visibility_timeout'])
+                if job is None:
+                    self.purge(options['purge_interval'])
+                    if options['once']:
+                        return
+                    self.stopping.wait(options['poll_interval'])
+                    continue
+                logger.info('running %s', job)
+                job.run()
+                logger.info('finished %s', job)
+        finally:
+            close_old_connections()
+
+    def purge(self, interval):
+        """Purge old jobs when idle, at most once per ``interval``."""
+        if not interval or not self.purge_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.monotonic()
+            if self.purged_at is None or now - self.purged_at >= interval:
+                self.purged_at = now
+                deleted = Job.purge(settings.JOBS_RETENTION)
+                logger.info('purged %d finished jobs', deleted)
+        except Exception:
+            logger.exception('purging finished jobs failed')
+        finally:
+            self.purge_lock.release()
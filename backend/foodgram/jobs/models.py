@@ -0,0 +1,125 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.utils import timezone
+
+from .registry import purge_hooks, tasks
+
+User = get_user_model()
+
+
+class Job(models.Model):
+    class Status(models.TextChoices):
+        QUEUED = 'queued'
+        RUNNING = 'running'
+        DONE = 'done'
+        FAILED = 'failed'
+
+    name = models.CharField(
+        verbose_name='task name',
+        max_length=200,
+    )
+    kwargs = models.JSONField(
+        verbose_name='arguments',
+        default=dict,
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        null=True,
+        blank=True,
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.QUEUED,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'job'
+        ordering = ('id',)
+        indexes = [
+            models.Index(
+                fields=['status', 'run_after'], name='job_status_run_after'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
+    @classmethod
+    def claim_next(cls, visibility_timeout):
+        """Lock the next runnable job for this worker, or return ``None``.
+
+        A job is runnable when it is queued and due, or when the worker
+        running it did not finish within its visibility timeout. Claiming
+        is a conditional update, so concurrent workers never share a job.
+        """
+        now = timezone.now()
+        candidates = cls.objects.filter(
+            models.Q(status=cls.Status.QUEUED, run_after__lte=now)
+            | models.Q(status=cls.Status.RUNNING, locked_until__lt=now)
+        ).order_by('run_after', 'id').values_list('id', 'locked_until')[:10]
+        for job_id, locked_until in candidates:
+            claimed = cls.objects.filter(
+                id=job_id, locked_until=locked_until
+            ).exclude(
+                status__in=(cls.Status.DONE, cls.Status.FAILED)
+            ).update(
+                status=cls.Status.RUNNING,
+                locked_until=now + timedelta(seconds=visibility_timeout),
+                attempts=models.F('attempts') + 1,
+                updated=now,
+            )
+            if claimed:
+                return cls.objects.get(id=job_id)
+        return None
+
+    @classmethod
+    def purge(cls, retention):
+        """Delete jobs finished more than ``retention`` seconds ago.
+
+        Purge hooks of the tasks then remove what the jobs left behind,
+        such as rendered files. Returns the number of deleted jobs.
+        """
+        before = timezone.now() - timedelta(seconds=retention)
+        deleted, _ = cls.objects.filter(
+            status__in=(cls.Status.DONE, cls.Status.FAILED),
+            updated__lt=before,
+        ).delete()
+        for purge in purge_hooks.values():
+            purge(before)
+        return deleted
+
+    def run(self):
+        """Execute the task, recording its result or scheduling a retry."""
+        if self.status != self.Status.RUNNING:
+            self.attempts += 1
+        try:
+            self.result = tasks[self.name](**self.kwargs)
+        except Exception:
+            self.error = traceback.format_exc()
+            if self.attempts < self.max_attempts:
+                self.status = self.Status.QUEUED
+                self.run_after = timezone.now() + timedelta(
+                    seconds=settings.JOBS_RETRY_DELAY * 2 ** self.attempts
+                )
+            else:
+                self.status = self.Status.FAILED
+        else:
+            self.status = self.Status.DONE
+            self.error = ''
+        self.locked_until = None
+        self.save()
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db import transaction
+
+tasks = {}
+purge_hooks = {}
+
+
+def task(name, purge=None):
+    """Register ``function`` as a background task called ``name``.
+
+    ``purge(before)`` removes what jobs of the task finished before
+    ``before`` left behind, see ``Job.purge``.
+    """
+    def decorator(function):
+        tasks[name] = function
+        if purge is not None:
+            purge_hooks[name] = purge
+        return function
+    return decorator
+
+
+def enqueue(name, user=None, max_attempts=None, **kwargs):
+    """Queue task ``name`` once the current transaction commits.
+
+    With ``JOBS_ALWAYS_EAGER`` the task runs inline instead, which keeps
+    development setups without a worker working.
+    """
+    from .models import Job
+
+    job = Job.objects.create(
+        name=name,
+        kwargs=kwargs,
+        user=user,
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    )
+    if settings.JOBS_ALWAYS_EAGER:
+        transaction.on_commit(job.run)
+    return job
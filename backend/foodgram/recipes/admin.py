@@ -1,15 +1,56 @@
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.forms import BaseInlineFormSet
 
+from .admin_filters import AutocompleteFilter, AutocompleteFilterMixin
 from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                     ShoppingCart, Tag)
+                     ShoppingCart, ShoppingListItem, Tag)
+from .search import update_search_index
+
+
+class PreloadedAutocompleteSelect(AutocompleteSelect):
+    """Autocomplete select labelled from ``labels`` when they cover it.
+
+    The stock widget loads the selected object once per form; inline
+    formsets fill ``labels`` for all their forms with one query.
+    """
+    labels = None
+
+    def optgroups(self, name, value, attr=None):
+        selected = [str(v) for v in value if v not in (None, '')]
+        if self.labels is None or not set(selected) <= self.labels.keys():
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        for option_value in selected:
+            options.append(self.create_option(
+                name, option_value, self.labels[option_value], True,
+                len(options)
+            ))
+        return [(None, options, 0)]
 
 
 class IngredientInRecipeFormSet(BaseInlineFormSet):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.min_num = 1
+        self.preload_ingredients()
+
+    def preload_ingredients(self):
+        ids = {
+            str(form['ingredient'].value()) for form in self.forms
+        }
+        labels = {
+            str(pk): str(ingredient)
+            for pk, ingredient in Ingredient.objects.in_bulk(
+                [pk for pk in ids if pk.isdigit()]
+            ).items()
+        }
+        for form in self.forms:
+            form.fields['ingredient'].widget.widget.labels = labels
 
     def clean(self):
         super().clean()
@@ -26,6 +67,17 @@ class IngredientInRecipeFormSet(BaseInlineFormSet):
 class IngredientInRecipeInline(admin.TabularInline):
     model = IngredientInRecipe
     formset = IngredientInRecipeFormSet
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'ingredient':
+            kwargs['widget'] = PreloadedAutocompleteSelect(
+                db_field, self.admin_site, using=kwargs.get('using')
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
 @admin.register(Tag)
@@ -41,42 +93,99 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     inlines = [IngredientInRecipeInline]
-    list_display = ('name', 'author', 'count_add_favorites')
-    list_filter = ('author', 'name', 'tags',)
-    search_fields = ('username', 'email', 'first_name', 'last_name',)
-    ordering = ('name',)
-
+    list_display = (
+        'name', 'author', 'count_add_favorites', 'in_carts_count'
+    )
+    list_filter = (('author', AutocompleteFilter), 'tags',)
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__username', 'author__email',)
+    autocomplete_fields = ('author', 'ingredients',)
+    show_full_result_count = False
+
+    def save_related(self, request, form, formsets, change):
+        with ShoppingListItem.objects.tracking_recipes([form.instance.id]):
+            super().save_related(request, form, formsets, change)
+        update_search_index([form.instance.id])
+
+    @admin.display(
+        description='Added to favorites', ordering='favorites_count'
+    )
     def count_add_favorites(self, obj):
-        return obj.favorites.count()
-
-    count_add_favorites.short_description = 'Added to favorites'
+        return obj.favorites_count
 
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('pk', 'name', 'measurement_unit')
-    list_filter = ('name',)
-    search_fields = ('ingredient',)
+    list_filter = ('measurement_unit',)
+    search_fields = ('^name',)
+    show_full_result_count = False
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('user', 'recipe',)
-    search_fields = ('user', 'recipe',)
-    list_filter = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe',)
+    search_fields = ('user__username', 'recipe__name',)
+    list_filter = (
+        ('user', AutocompleteFilter), ('recipe', AutocompleteFilter),
+    )
+    autocomplete_fields = ('user', 'recipe',)
+    show_full_result_count = False
 
 
 @admin.register(IngredientInRecipe)
-class IngredientInRecipeAdmin(admin.ModelAdmin):
+class IngredientInRecipeAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('recipe', 'ingredient', 'amount',)
-    search_fields = ('recipe', 'ingredient',)
-    list_filter = ('recipe', 'ingredient',)
+    list_select_related = ('recipe', 'ingredient',)
+    search_fields = ('recipe__name', 'ingredient__name',)
+    list_filter = (
+        ('recipe', AutocompleteFilter), ('ingredient', AutocompleteFilter),
+    )
+    autocomplete_fields = ('recipe', 'ingredient',)
+    show_full_result_count = False
+
+    # Rows are written one by one here, so shopping lists of carts
+    # holding the recipe are adjusted around each change.
+    def save_model(self, request, obj, form, change):
+        recipe_ids = {obj.recipe_id, form.initial.get('recipe')} - {None}
+        with ShoppingListItem.objects.tracking_recipes(recipe_ids):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with ShoppingListItem.objects.tracking_recipes([obj.recipe_id]):
+            super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        with ShoppingListItem.objects.tracking_recipes(
+            set(queryset.values_list('recipe_id', flat=True))
+        ):
+            super().delete_queryset(request, queryset)
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('user', 'recipe',)
-    search_fields = ('user', 'recipe',)
-    list_filter = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe',)
+    search_fields = ('user__username', 'recipe__name',)
+    list_filter = (
+        ('user', AutocompleteFilter), ('recipe', AutocompleteFilter),
+    )
+    autocomplete_fields = ('user', 'recipe',)
+    show_full_result_count = False
+
+    def get_readonly_fields(self, request, obj=None):
+        # Moving an item would bypass the shopping list bookkeeping.
+        if obj is not None:
+            return ('user', 'recipe')
+        return super().get_readonly_fields(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        recipes_by_user = {}
+        for user_id, recipe_id in queryset.values_list('user_id', 'recipe_id'):
+            recipes_by_user.setdefault(user_id, []).append(recipe_id)
+        for user_id, recipe_ids in recipes_by_user.items():
+            ShoppingCart.objects.remove_recipes(user_id, recipe_ids)
@@ -0,0 +1,59 @@
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.utils.translation import gettext_lazy as _
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """Related field filter choosing its value with an autocomplete widget.
+
+    Unlike the stock related filter it never lists the related table in
+    the sidebar; only the selected object is loaded. The related model
+    admin needs ``search_fields``, and the model admin using the filter
+    must include ``AutocompleteFilterMixin`` for the widget media.
+    """
+    template = 'admin/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        self.lookup_val = params.get(self.lookup_kwarg)
+        super().__init__(
+            field, request, params, model, model_admin, field_path
+        )
+        self.form_field = forms.ModelChoiceField(
+            queryset=field.remote_field.model._default_manager.all(),
+            required=False,
+            widget=AutocompleteSelect(
+                field, model_admin.admin_site, attrs={'style': 'width: 100%'}
+            ),
+        )
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(
+                remove=[self.lookup_kwarg]
+            ),
+            'display': _('All'),
+        }
+
+    @property
+    def rendered_widget(self):
+        return self.form_field.widget.render(
+            self.lookup_kwarg, self.lookup_val
+        )
+
+
+class AutocompleteFilterMixin:
+    """Add the media used by ``AutocompleteFilter`` to a model admin."""
+
+    @property
+    def media(self):
+        return (
+            super().media
+            + AutocompleteSelect(None, self.admin_site).media
+            + forms.Media(js=['recipes/js/autocomplete_filter.js'])
+        )
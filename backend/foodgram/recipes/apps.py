@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate, pre_migrate
+
+        from .backfill import backfill_counters, backfill_shopping_lists
+        from .merge import merge_duplicate_ingredients
+        from .search import create_search_structures
+        pre_migrate.connect(merge_duplicate_ingredients, sender=self)
+        post_migrate.connect(create_search_structures, sender=self)
+        post_migrate.connect(backfill_counters, sender=self)
+        post_migrate.connect(backfill_shopping_lists, sender=self)
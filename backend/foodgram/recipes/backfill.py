@@ -0,0 +1,64 @@
+"""Backfills of data kept alongside the models.
+
+Migrations are generated at deploy time, so rows that existed before a
+denormalized table or column was added are filled in on
+``post_migrate``. Each step only writes what is missing or out of sync
+and is safe to repeat.
+"""
+from django.db import connections
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from users.models import Subscribe, User
+
+from .models import Favorite, Recipe, ShoppingCart, ShoppingListItem
+
+# (model, counter field, counted model, its foreign key to the model)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscribe, 'author'),
+)
+
+
+def actual_count(related_model, related_field):
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(
+                **{related_field: OuterRef('pk')}
+            ).order_by().values(related_field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0,
+    )
+
+
+def _tables_exist(using, *models):
+    existing = set(connections[using].introspection.table_names())
+    return {model._meta.db_table for model in models} <= existing
+
+
+def backfill_counters(using='default', **kwargs):
+    """Recount denormalized counters that differ from the rows they count.
+
+    Counters added to existing tables start at zero.
+    """
+    for model, field, related_model, related_field in COUNTERS:
+        if not _tables_exist(using, model, related_model):
+            continue
+        actual = actual_count(related_model, related_field)
+        model.objects.using(using).exclude(
+            **{field: actual}
+        ).update(**{field: actual})
+
+
+def backfill_shopping_lists(using='default', **kwargs):
+    """Build the lists of users with carts but no shopping list rows."""
+    if not _tables_exist(using, ShoppingCart, ShoppingListItem):
+        return
+    user_ids = list(ShoppingCart.objects.using(using).exclude(
+        user__shopping_list__isnull=False
+    ).values_list('user_id', flat=True).distinct())
+    if user_ids:
+        ShoppingListItem.objects.db_manager(using).rebuild(user_ids)
@@ -0,0 +1,127 @@
+"""Subscription feed built by fan-out on write.
+
+A new recipe is pushed into the timelines of its author's followers in
+batches, and every timeline keeps about ``FEED_LENGTH`` newest entries.
+Recipes of authors with more than ``FEED_FANOUT_LIMIT`` followers are
+not pushed; the feed pulls them from ``Recipe`` when it is read.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Subquery
+from users.models import Subscribe
+
+from .models import Recipe, TimelineEntry
+
+
+def is_pulled(author):
+    return author.followers_count > settings.FEED_FANOUT_LIMIT
+
+
+def push_recipe(recipe):
+    """Add ``recipe`` to the timelines of its author's followers."""
+    if is_pulled(recipe.author):
+        return 0
+    pushed = 0
+    last_user_id = 0
+    while True:
+        user_ids = list(Subscribe.objects.filter(
+            author_id=recipe.author_id, user_id__gt=last_user_id
+        ).order_by('user_id').values_list(
+            'user_id', flat=True
+        )[:settings.FEED_FANOUT_BATCH])
+        if not user_ids:
+            return pushed
+        with transaction.atomic():
+            TimelineEntry.objects.bulk_create(
+                [TimelineEntry(user_id=user_id, recipe_id=recipe.id)
+                 for user_id in user_ids],
+                ignore_conflicts=True,
+            )
+            trim_timelines(user_ids)
+        pushed += len(user_ids)
+        last_user_id = user_ids[-1]
+
+
+def trim_timelines(user_ids):
+    """Cut timelines longer than ``FEED_LENGTH`` plus some slack.
+
+    The slack makes a timeline shrink once in ``FEED_TRIM_SLACK`` pushes
+    rather than on each of them.
+    """
+    too_long = list(TimelineEntry.objects.filter(
+        user_id__in=user_ids
+    ).values('user_id').annotate(
+        entries=Count('id')
+    ).filter(
+        entries__gt=settings.FEED_LENGTH + settings.FEED_TRIM_SLACK
+    ).values_list('user_id', flat=True))
+    for user_id in too_long:
+        oldest_kept = TimelineEntry.objects.filter(
+            user_id=user_id
+        ).order_by('-recipe_id').values('recipe_id')[
+            settings.FEED_LENGTH - 1:settings.FEED_LENGTH
+        ]
+        TimelineEntry.objects.filter(
+            user_id=user_id, recipe_id__lt=Subquery(oldest_kept)
+        ).delete()
+
+
+def backfill_timeline(user_id, author):
+    """Push the newest recipes of a newly followed author."""
+    if is_pulled(author):
+        return
+    recipe_ids = Recipe.objects.filter(author=author).order_by(
+        '-id'
+    ).values_list('id', flat=True)[:settings.FEED_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, recipe_id=recipe_id)
+         for recipe_id in recipe_ids],
+        ignore_conflicts=True,
+    )
+    trim_timelines([user_id])
+
+
+def rebuild_timeline(user_id, author_ids):
+    """Replace the timeline with the newest recipes of ``author_ids``."""
+    recipe_ids = Recipe.objects.filter(author__in=author_ids).order_by(
+        '-id'
+    ).values_list('id', flat=True)[:settings.FEED_LENGTH]
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(user_id=user_id, recipe_id=recipe_id)
+            for recipe_id in recipe_ids
+        )
+
+
+def remove_author(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def get_feed_recipe_ids(user, limit, before=None):
+    """Return up to ``limit`` recipe ids of the feed, newest first.
+
+    Ids come from the timeline merged with the recipes of followed
+    authors who are pulled, each read with an index seek below
+    ``before``.
+    """
+    pushed = TimelineEntry.objects.filter(user=user)
+    if before is not None:
+        pushed = pushed.filter(recipe_id__lt=before)
+    recipe_ids = set(pushed.order_by('-recipe_id').values_list(
+        'recipe_id', flat=True
+    )[:limit])
+    pulled_authors = list(Subscribe.objects.filter(
+        user=user,
+        author__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values_list('author_id', flat=True))
+    if pulled_authors:
+        pulled = Recipe.objects.filter(author__in=pulled_authors)
+        if before is not None:
+            pulled = pulled.filter(id__lt=before)
+        recipe_ids.update(pulled.order_by('-id').values_list(
+            'id', flat=True
+        )[:limit])
+    return sorted(recipe_ids, reverse=True)[:limit]
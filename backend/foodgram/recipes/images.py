@@ -0,0 +1,90 @@
+"""Recipe image processing.
+
+Uploads are decoded once: the same Pillow image is re-encoded without
+metadata and scaled into the renditions listed in
+``settings.IMAGE_RENDITIONS``, each stored as JPEG and WebP next to the
+original.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+FORMATS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+    'GIF': 'gif',
+}
+
+
+def _encode(image, image_format, **options):
+    buffer = io.BytesIO()
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def process_image(content, with_renditions=True):
+    """Validate raw image bytes and return a clean file with renditions.
+
+    The returned ``ContentFile`` carries a ``renditions`` dict mapping a
+    rendition key to its size name, encoded bytes and file extension,
+    left empty when ``with_renditions`` is false.
+    """
+    try:
+        image = Image.open(io.BytesIO(content))
+        image_format = image.format
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ValidationError('Upload a valid image.')
+    if image_format not in FORMATS:
+        raise ValidationError(f'Unsupported image format: {image_format}')
+    image = ImageOps.exif_transpose(image)
+    cleaned = ContentFile(
+        _encode(image, image_format, **settings.IMAGE_SAVE_OPTIONS),
+        name=f'image.{FORMATS[image_format]}',
+    )
+    cleaned.renditions = {}
+    if not with_renditions:
+        return cleaned
+    for key, size in settings.IMAGE_RENDITIONS.items():
+        rendition = image.copy()
+        rendition.thumbnail(size, Image.Resampling.LANCZOS)
+        cleaned.renditions[key] = (
+            key,
+            _encode(rendition, 'JPEG', **settings.IMAGE_SAVE_OPTIONS),
+            'jpg',
+        )
+        cleaned.renditions[f'{key}_webp'] = (
+            key,
+            _encode(rendition, 'WEBP', **settings.IMAGE_SAVE_OPTIONS),
+            'webp',
+        )
+    return cleaned
+
+
+def store_renditions(image_name, renditions):
+    """Save renditions next to ``image_name`` and return their names."""
+    base = os.path.splitext(image_name)[0]
+    return {
+        key: default_storage.save(
+            f'{base}_{size}.{extension}', ContentFile(content)
+        )
+        for key, (size, content, extension) in renditions.items()
+    }
+
+
+def generate_renditions(recipe):
+    """Build renditions of an already stored recipe image."""
+    with recipe.image.open('rb') as image_file:
+        processed = process_image(image_file.read())
+    recipe.image_renditions = store_renditions(
+        recipe.image.name, processed.renditions
+    )
+    recipe.save(update_fields=['image_renditions'])
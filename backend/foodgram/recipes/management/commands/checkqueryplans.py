@@ -0,0 +1,258 @@
+import re
+import time
+from io import StringIO
+
+from api.authentication import TOKEN_KEYWORD
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.urls import reverse
+from recipes.feed import push_recipe
+from recipes.models import Recipe, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Subscribe, User
+
+# Seeded dataset, large enough for the planner to prefer indexes.
+SEED_SIZES = {
+    'users': 20000,
+    'recipes': 100000,
+    'ingredients': 2000,
+    'favorites': 1000000,
+    'carts': 100000,
+    'subscriptions': 200000,
+}
+MIN_EXISTING_RECIPES = 10000
+# Tables small enough for a sequential scan to be the right plan.
+SMALL_TABLES = {'recipes_tag'}
+UNCACHED = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+SEQ_SCAN_RE = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(
+        r'\bSCAN (?:TABLE )?(\w+)(?! USING| VIRTUAL)(?:\s|$)'
+    ),
+}
+
+
+EXPLAINED_STATEMENTS = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+# Counting a whole table reads all of it whatever the plan; the
+# pagination caches these counts instead.
+WHOLE_TABLE_COUNT_RE = re.compile(
+    r'SELECT COUNT\(\*\)(?: AS "__count")? FROM "\w+"$'
+)
+
+
+class StatementRecorder:
+    """Execute wrapper keeping the distinct statements worth explaining."""
+
+    def __init__(self):
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith(
+            EXPLAINED_STATEMENTS
+        ):
+            if not WHOLE_TABLE_COUNT_RE.match(sql.strip()):
+                self.statements.setdefault(sql, params)
+        return execute(sql, params, many, context)
+
+
+def hot_paths(client, user, recipe, tags, author):
+    """Code paths the API runs most, keyed by a label.
+
+    Requests go through the URL configuration, so the plans cover the
+    view querysets, ``RecipeFilter``, ``get_subscriptions`` and the
+    pagination classes exactly as clients reach them.
+    """
+    recipes = reverse('api:recipes-list')
+    detail = reverse('api:recipes-detail', args=[recipe.id])
+    word = recipe.name.split()[0]
+
+    def send(method, path, data=None):
+        response = getattr(client, method)(path, data)
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{method.upper()} {path}: {response.status_code}'
+            )
+        b''.join(response)
+
+    def get(path, data=None):
+        return lambda: send('get', path, data)
+
+    def toggle(path):
+        def run():
+            send('post', path)
+            send('delete', path)
+        return run
+
+    return {
+        'recipe list': get(recipes),
+        'recipe list, page 3': get(recipes, {'page': 3}),
+        'recipe list, cursor': get(recipes, {'cursor': ''}),
+        'recipe list, deep cursor': get(recipes, {'cursor': recipe.id}),
+        'recipes by tags': get(
+            recipes, {'tags': [tag.slug for tag in tags]}
+        ),
+        'recipes by author': get(recipes, {'author': author.id}),
+        'favorited recipes': get(recipes, {'is_favorite': 1}),
+        'favorited recipes by tag': get(
+            recipes, {'is_favorite': 1, 'tags': tags[0].slug}
+        ),
+        'recipes by popularity': get(recipes, {'ordering': '-popularity'}),
+        'recipe search': get(recipes, {'search': word}),
+        'recipe detail': get(detail),
+        'feed': get(reverse('api:recipes-feed')),
+        'subscriptions': get(reverse('api:users-subscriptions')),
+        'shopping list download': get(
+            reverse('api:recipes-download-shopping-cart')
+        ),
+        'favorite and unfavorite': toggle(
+            reverse('api:recipes-favorite', args=[recipe.id])
+        ),
+        'add to and remove from cart': toggle(
+            reverse('api:recipes-shopping-cart', args=[recipe.id])
+        ),
+        'subscribe and unsubscribe': toggle(
+            reverse('api:users-subscribe', args=[author.id])
+        ),
+        'feed fan-out': lambda: push_recipe(recipe),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a large synthetic dataset, run the hot API requests, EXPLAIN '
+        'the queries they send and fail on sequential scans. The dataset is '
+        'rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--use-existing-data',
+            action='store_true',
+            help='Explain against the current data instead of seeding; it '
+                 f'needs at least {MIN_EXISTING_RECIPES} recipes',
+        )
+        for name, default in SEED_SIZES.items():
+            parser.add_argument(
+                f'--{name}', type=int, default=default,
+                help='Size of the seeded dataset',
+            )
+        parser.add_argument(
+            '--no-seqscan',
+            action='store_true',
+            help='PostgreSQL only: disable sequential scans in the planner, '
+                 'so a small dataset still shows whether an index is usable',
+        )
+        parser.add_argument(
+            '--verbose-plans', action='store_true', help='Print every plan'
+        )
+
+    def handle(self, *args, **options):
+        pattern = SEQ_SCAN_RE.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'Unsupported database: {connection.vendor}')
+        with transaction.atomic():
+            if options['use_existing_data']:
+                self.check_existing_data()
+            else:
+                self.seed(options)
+            failures = self.explain_hot_queries(pattern, options)
+            transaction.set_rollback(True)
+        if failures:
+            raise CommandError(f'{failures} code paths scan whole tables')
+        self.stdout.write(self.style.SUCCESS('all hot code paths use indexes'))
+
+    @staticmethod
+    def check_existing_data():
+        recipes = Recipe.objects.count()
+        if recipes < MIN_EXISTING_RECIPES:
+            raise CommandError(
+                f'Only {recipes} recipes: the planner prefers sequential '
+                f'scans on small tables, so the plans would say nothing. '
+                f'Drop --use-existing-data to seed a dataset.'
+            )
+
+    def seed(self, options):
+        started = time.monotonic()
+        call_command(
+            'generatedata',
+            **{name: options[name] for name in SEED_SIZES},
+            stdout=self.stdout if options['verbosity'] > 1 else StringIO(),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(
+            f'seeded in {time.monotonic() - started:.1f}s, '
+            f'rolled back when done'
+        )
+
+    def explain_hot_queries(self, pattern, options):
+        user = User.objects.filter(
+            favorites__isnull=False, shopping_carts__isnull=False
+        ).last()
+        recipe = Recipe.objects.exclude(favorites__user=user).exclude(
+            shopping_carts__user=user
+        ).first()
+        tags = list(Tag.objects.order_by('-id')[:2])
+        if None in (user, recipe) or not tags:
+            raise CommandError('Load or generate data first')
+        author = User.objects.exclude(id__in=Subscribe.objects.filter(
+            user=user
+        ).values('author_id')).exclude(id=user.id).filter(
+            recipes__isnull=False
+        ).first()
+        if options['no_seqscan'] and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        token, _ = Token.objects.get_or_create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'{TOKEN_KEYWORD} {token}')
+        failures = 0
+        # Caches would hide the queries behind a warm entry.
+        with override_settings(CACHES=UNCACHED):
+            paths = hot_paths(client, user, recipe, tags, author)
+            for label, run in paths.items():
+                recorder = StatementRecorder()
+                with connection.execute_wrapper(recorder):
+                    run()
+                failures += self.explain(
+                    label, recorder.statements, pattern, options
+                )
+        return failures
+
+    @staticmethod
+    def scanned_tables(pattern, sql, plan):
+        # SQLite shows a walk in primary key order as a plain SCAN; with
+        # a LIMIT and no sort step it stops early like an index scan.
+        if (
+            connection.vendor == 'sqlite'
+            and ' ORDER BY ' in sql and ' LIMIT ' in sql
+            and 'FOR ORDER BY' not in plan
+        ):
+            return set()
+        return set(pattern.findall(plan))
+
+    def explain(self, label, statements, pattern, options):
+        prefix = connection.ops.explain_query_prefix()
+        table_names = set(connection.introspection.table_names())
+        scans = set()
+        with connection.cursor() as cursor:
+            for sql, params in statements.items():
+                cursor.execute(f'{prefix} {sql}', params)
+                plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+                tables = self.scanned_tables(pattern, sql, plan)
+                tables = tables & table_names - SMALL_TABLES
+                if options['verbose_plans'] or tables:
+                    self.stdout.write(f'-- {label}\n{sql}\n{plan}')
+                scans |= tables
+        if scans:
+            self.stdout.write(self.style.ERROR(
+                f'{label}: sequential scan on {", ".join(sorted(scans))}'
+            ))
+            return 1
+        self.stdout.write(f'{label}: ok, {len(statements)} statements')
+        return 0
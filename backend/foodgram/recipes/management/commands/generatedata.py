@@ -0,0 +1,366 @@
+import csv
+import io
+import math
+import random
+import time
+from itertools import islice
+
+from api.cache import invalidate_blob
+from api.ingredient_index import ingredient_index
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag)
+from users.models import Subscribe, User
+
+WORDS = (
+    'apple', 'beef', 'butter', 'carrot', 'cheese', 'chicken', 'dill',
+    'egg', 'flour', 'garlic', 'honey', 'lemon', 'milk', 'onion', 'pepper',
+    'potato', 'rice', 'salt', 'sugar', 'tomato',
+)
+UNITS = ('g', 'kg', 'ml', 'l', 'pcs', 'tbsp', 'tsp')
+NULL = r'\N'
+
+
+class PowerLaw:
+    """Draw indexes in ``range(size)`` with P(rank k) ~ k ** -alpha.
+
+    Uses the inverse CDF of the continuous distribution, so no weight
+    table is kept in memory. Ranks are spread over the indexes by a
+    multiplicative permutation, so popular rows are not all the oldest.
+    """
+
+    def __init__(self, rng, size, alpha):
+        self.random = rng.random
+        self.size = size
+        self.alpha = alpha
+        self.step = self.coprime_step(rng, size)
+
+    @staticmethod
+    def coprime_step(rng, size):
+        while True:
+            step = rng.randrange(1, max(size, 2)) | 1
+            if math.gcd(step, size) == 1:
+                return step
+
+    def __call__(self):
+        if self.alpha == 1:
+            rank = (self.size + 1) ** self.random()
+        else:
+            power = 1 - self.alpha
+            rank = (
+                ((self.size + 1) ** power - 1) * self.random() + 1
+            ) ** (1 / power)
+        rank = min(int(rank) - 1, self.size - 1)
+        return rank * self.step % self.size
+
+    def sample(self, count, exclude=None):
+        """Draw up to ``count`` distinct indexes."""
+        chosen = set()
+        attempts = count * 4
+        while len(chosen) < count and attempts:
+            index = self()
+            if index != exclude:
+                chosen.add(index)
+            attempts -= 1
+        return chosen
+
+
+class RowWriter:
+    """Insert raw rows in batches: ``COPY`` on PostgreSQL, else executemany.
+
+    Both skip building model instances, which dominates ``bulk_create``
+    time at this volume.
+    """
+
+    def __init__(self, stdout, batch_size):
+        self.stdout = stdout
+        self.batch_size = batch_size
+
+    def write(self, model, fields, rows):
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(
+            connection.ops.quote_name(model._meta.get_field(field).column)
+            for field in fields
+        )
+        started = time.monotonic()
+        written = 0
+        rows = iter(rows)
+        with connection.cursor() as cursor:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                if connection.vendor == 'postgresql':
+                    self.copy(cursor, table, columns, batch)
+                else:
+                    placeholders = ', '.join(['%s'] * len(fields))
+                    cursor.executemany(
+                        f'INSERT INTO {table} ({columns}) '
+                        f'VALUES ({placeholders})',
+                        batch,
+                    )
+                written += len(batch)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f'{model._meta.db_table}: {written} rows, '
+            f'{written / elapsed:.0f} rows/s'
+        )
+        return written
+
+    @staticmethod
+    def copy(cursor, table, columns, batch):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in batch:
+            writer.writerow(NULL if value is None else value for value in row)
+        sql = (
+            f'COPY {table} ({columns}) FROM STDIN '
+            f"WITH (FORMAT csv, NULL '{NULL}')"
+        )
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):
+            buffer.seek(0)
+            raw.copy_expert(sql, buffer)
+        else:
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a deterministic synthetic dataset with power-law '
+        'distributed authors, favorites, carts and subscriptions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8,
+            help='Average number of ingredients in a recipe',
+        )
+        parser.add_argument('--favorites', type=int, default=50000)
+        parser.add_argument('--carts', type=int, default=5000)
+        parser.add_argument('--subscriptions', type=int, default=10000)
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Power-law exponent of author and recipe popularity',
+        )
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--password',
+            help='Password of the generated users, unusable by default',
+        )
+
+    def handle(self, *args, **options):
+        for name in ('users', 'recipes', 'ingredients', 'tags'):
+            if options[name] < 1:
+                raise CommandError(f'--{name} must be positive')
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.writer = RowWriter(self.stdout, options['batch_size'])
+        started = time.monotonic()
+        with transaction.atomic():
+            self.user_ids = self.create_users()
+            self.tag_ids = self.create_tags()
+            self.ingredient_ids = self.create_ingredients()
+            self.recipe_ids = self.create_recipes()
+            self.create_recipe_tags()
+            self.create_recipe_ingredients()
+            self.create_user_links(
+                Favorite, options['favorites'], self.recipe_ids
+            )
+            self.create_user_links(
+                ShoppingCart, options['carts'], self.recipe_ids
+            )
+            self.create_subscriptions()
+            self.create_shopping_lists()
+            self.reset_sequences()
+        call_command('reconcilecounters', stdout=self.stdout)
+        invalidate_blob('ingredients')
+        invalidate_blob('tags')
+        ingredient_index.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'dataset generated in {time.monotonic() - started:.1f}s; '
+            f'run rebuildsearchindex to make the recipes searchable'
+        ))
+
+    def create_users(self):
+        first = next_id(User)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        password = (
+            make_password(self.options['password'])
+            if self.options['password'] else '!generated'
+        )
+        count = self.options['users']
+        self.writer.write(
+            User,
+            ('id', 'password', 'is_superuser', 'username', 'first_name',
+             'last_name', 'email', 'is_staff', 'is_active', 'date_joined',
+             'access_levels', 'recipes_count', 'followers_count'),
+            (
+                (pk, password, False, f'user{pk}', 'User', str(pk),
+                 f'user{pk}@example.com', False, True, now,
+                 User.AccessLevels.AUTHORIZED, 0, 0)
+                for pk in range(first, first + count)
+            ),
+        )
+        return range(first, first + count)
+
+    def create_tags(self):
+        first = next_id(Tag)
+        count = self.options['tags']
+        self.writer.write(
+            Tag,
+            ('id', 'name', 'color', 'slug'),
+            (
+                (pk, f'tag {pk}', f'#{pk % 0x1000000:06X}', f'tag-{pk}')
+                for pk in range(first, first + count)
+            ),
+        )
+        return range(first, first + count)
+
+    def create_ingredients(self):
+        first = next_id(Ingredient)
+        count = self.options['ingredients']
+        rng = self.rng
+        self.writer.write(
+            Ingredient,
+            ('id', 'name', 'measurement_unit'),
+            (
+                (pk, f'{rng.choice(WORDS)} {pk}', rng.choice(UNITS))
+                for pk in range(first, first + count)
+            ),
+        )
+        return range(first, first + count)
+
+    def create_recipes(self):
+        first = next_id(Recipe)
+        count = self.options['recipes']
+        rng = self.rng
+        author = PowerLaw(rng, len(self.user_ids), self.options['alpha'])
+        self.writer.write(
+            Recipe,
+            ('id', 'author', 'name', 'image', 'image_renditions', 'text',
+             'cooking_time', 'favorites_count', 'in_carts_count'),
+            (
+                (pk, self.user_ids[author()],
+                 f'{rng.choice(WORDS)} {rng.choice(WORDS)} {pk}',
+                 'recipes/generated.png', '{}',
+                 ' '.join(rng.choices(WORDS, k=30)),
+                 rng.randint(1, 180), 0, 0)
+                for pk in range(first, first + count)
+            ),
+        )
+        return range(first, first + count)
+
+    def create_recipe_tags(self):
+        rng = self.rng
+        tag_count = len(self.tag_ids)
+        self.writer.write(
+            Recipe.tags.through,
+            ('recipe', 'tag'),
+            (
+                (recipe_id, self.tag_ids[index])
+                for recipe_id in self.recipe_ids
+                for index in rng.sample(
+                    range(tag_count), min(tag_count, rng.randint(1, 3))
+                )
+            ),
+        )
+
+    def create_recipe_ingredients(self):
+        rng = self.rng
+        average = self.options['ingredients_per_recipe']
+        ingredient = PowerLaw(rng, len(self.ingredient_ids), 1.0)
+        self.writer.write(
+            IngredientInRecipe,
+            ('recipe', 'ingredient', 'amount'),
+            (
+                (recipe_id, self.ingredient_ids[index], rng.randint(1, 500))
+                for recipe_id in self.recipe_ids
+                for index in ingredient.sample(
+                    max(1, round(rng.gauss(average, average / 3)))
+                )
+            ),
+        )
+
+    def activity(self, total):
+        """Yield (user id, number of rows) with exponentially skewed counts."""
+        average = total / len(self.user_ids)
+        for user_id in self.user_ids:
+            yield user_id, round(self.rng.expovariate(1 / average))
+
+    def create_user_links(self, model, total, target_ids):
+        if total < 1:
+            return
+        target = PowerLaw(self.rng, len(target_ids), self.options['alpha'])
+        self.writer.write(
+            model,
+            ('user', 'recipe'),
+            (
+                (user_id, target_ids[index])
+                for user_id, count in self.activity(total)
+                for index in target.sample(min(count, len(target_ids) // 2))
+            ),
+        )
+
+    def create_subscriptions(self):
+        total = self.options['subscriptions']
+        if total < 1:
+            return
+        author = PowerLaw(self.rng, len(self.user_ids), self.options['alpha'])
+        first = self.user_ids[0]
+        self.writer.write(
+            Subscribe,
+            ('user', 'author'),
+            (
+                (user_id, self.user_ids[index])
+                for user_id, count in self.activity(total)
+                for index in author.sample(
+                    min(count, len(self.user_ids) // 2),
+                    exclude=user_id - first,
+                )
+            ),
+        )
+
+    def create_shopping_lists(self):
+        quote = connection.ops.quote_name
+        items = quote(ShoppingListItem._meta.db_table)
+        carts = quote(ShoppingCart._meta.db_table)
+        amounts = quote(IngredientInRecipe._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {items} (user_id, ingredient_id, total_amount) '
+                f'SELECT cart.user_id, amount.ingredient_id, '
+                f'SUM(amount.amount) FROM {carts} cart '
+                f'JOIN {amounts} amount ON amount.recipe_id = cart.recipe_id '
+                f'WHERE cart.user_id >= %s '
+                f'GROUP BY cart.user_id, amount.ingredient_id',
+                [self.user_ids[0]],
+            )
+            self.stdout.write(
+                f'{ShoppingListItem._meta.db_table}: {cursor.rowcount} rows'
+            )
+
+    @staticmethod
+    def reset_sequences():
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Tag, Ingredient, Recipe]
+        )
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from recipes.images import generate_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Generate image renditions for recipes that have none'
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.filter(image_renditions={}).exclude(image='')
+        total = 0
+        for recipe in recipes.iterator():
+            try:
+                generate_renditions(recipe)
+            except Exception as error:
+                self.stderr.write(f'recipe {recipe.id}: {error}')
+                continue
+            total += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'generated renditions for {total} recipes')
+        )
@@ -1,22 +1,186 @@
+import csv
 import json
+import operator
+import os
+import re
+import time
+from functools import reduce
+from itertools import islice
 
-from django.core.management.base import BaseCommand
-from recipes.models import Ingredient
+from api.cache import invalidate_blob
+from api.ingredient_index import ingredient_index
+from api.signals import invalidate_recipes
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from recipes.models import Ingredient, Recipe, Tag
+
+MODELS = {
+    'ingredients': (Ingredient, ('name', 'measurement_unit')),
+    'tags': (Tag, ('name', 'color', 'slug')),
+}
+READ_SIZE = 64 * 1024
+SEPARATOR_RE = re.compile(r'[\s,]*')
+
+
+def read_json(file):
+    """Yield the items of a JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('JSON file must contain an array')
+    position = 1
+    while True:
+        position = SEPARATOR_RE.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError('Unexpected end of JSON file')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item
+
+
+def read_ndjson(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(file, fields):
+    for row in csv.reader(file):
+        if not row or tuple(row) == fields:
+            continue
+        yield dict(zip(fields, row))
 
 
 class Command(BaseCommand):
-    help = 'Load data from json file'
+    help = 'Load ingredients or tags from json, ndjson or csv file'
 
     def add_arguments(self, parser):
         parser.add_argument('json_file', type=str)
+        parser.add_argument(
+            '--model', choices=MODELS, default='ingredients'
+        )
+        parser.add_argument(
+            '--format', choices=('json', 'ndjson', 'csv'),
+            help='Input format, guessed from the file extension by default',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def read(self, file, file_format, fields):
+        if file_format == 'csv':
+            return read_csv(file, fields)
+        if file_format == 'ndjson':
+            return read_ndjson(file)
+        return read_json(file)
+
+    def save(self, model, batch):
+        if model is Tag:
+            self.save_tags(batch)
+        else:
+            model.objects.bulk_create(
+                [model(**item) for item in batch], ignore_conflicts=True
+            )
+
+    @staticmethod
+    def save_tags(batch):
+        """Upsert tags matched on any of their unique columns.
+
+        A row sharing the slug, name or color of an existing tag updates
+        that tag, so renaming a slug does not hit the other constraints.
+        Rows matching several different tags cannot be applied. The bulk
+        update sends no signals, so cached recipes of changed tags are
+        dropped here.
+        """
+        fields = MODELS['tags'][1]
+        existing = Tag.objects.filter(reduce(operator.or_, (
+            Q(**{f'{field}__in': [item[field] for item in batch]})
+            for field in fields
+        )))
+        by_field = {
+            field: {getattr(tag, field): tag for tag in existing}
+            for field in fields
+        }
+        to_create, to_update = [], {}
+        for item in batch:
+            matches = {
+                by_field[field][item[field]]
+                for field in fields if item[field] in by_field[field]
+            }
+            if len(matches) > 1:
+                raise CommandError(
+                    f'Tag {item} matches several existing tags: '
+                    + ', '.join(sorted(tag.slug for tag in matches))
+                )
+            if not matches:
+                to_create.append(Tag(**item))
+                continue
+            tag = matches.pop()
+            if any(getattr(tag, field) != item[field] for field in fields):
+                for field in fields:
+                    setattr(tag, field, item[field])
+                to_update[tag.pk] = tag
+        try:
+            with transaction.atomic():
+                Tag.objects.bulk_update(to_update.values(), fields)
+                Tag.objects.bulk_create(to_create)
+                invalidate_recipes(Recipe.objects.filter(
+                    tags__in=list(to_update)
+                ).values_list('id', flat=True).distinct())
+        except IntegrityError as error:
+            raise CommandError(f'Conflicting tags in the batch: {error}')
 
     def handle(self, *args, **options):
         json_file = options['json_file']
-        with open(json_file, 'r') as f:
-            data = json.load(f)
+        file_format = (
+            options['format']
+            or os.path.splitext(json_file)[1].lstrip('.').lower()
+        )
+        if file_format not in ('json', 'ndjson', 'csv'):
+            raise CommandError(f'Unknown file format: {file_format}')
+        model, fields = MODELS[options['model']]
+        batch_size = options['batch_size']
+        rows_before = model.objects.count()
+        loaded = 0
+        started = time.monotonic()
+
+        with open(json_file, 'r', encoding='utf-8', newline='') as f:
+            items = (
+                {field: item[field] for field in fields}
+                for item in self.read(f, file_format, fields)
+            )
+            while True:
+                batch = self.deduplicate(list(islice(items, batch_size)))
+                if not batch:
+                    break
+                self.save(model, batch)
+                loaded += len(batch)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'{loaded} rows, {loaded / elapsed:.0f} rows/s'
+                )
 
-        for item in data:
-            my_model = Ingredient(**item)
-            my_model.save()
+        invalidate_blob(options['model'])
+        if model is Ingredient:
+            ingredient_index.invalidate()
+        created = model.objects.count() - rows_before
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'successfully loaded {loaded} rows ({created} new) '
+            f'in {elapsed:.1f}s'
+        ))
 
-        self.stdout.write(self.style.SUCCESS('successfully'))
+    @staticmethod
+    def deduplicate(batch):
+        """Keep the last row per natural key, as upserts would."""
+        unique = {}
+        for item in batch:
+            key = item.get('slug') or (item['name'], item['measurement_unit'])
+            unique[key] = item
+        return list(unique.values())
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+from recipes.search import create_search_structures, update_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the recipe full-text search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        create_search_structures()
+        recipe_ids = Recipe.objects.order_by('id').values_list(
+            'id', flat=True
+        )
+        batch_size = options['batch_size']
+        batch = []
+        total = 0
+        for recipe_id in recipe_ids.iterator(chunk_size=batch_size):
+            batch.append(recipe_id)
+            if len(batch) == batch_size:
+                update_search_index(batch)
+                total += len(batch)
+                batch = []
+        update_search_index(batch)
+        total += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'indexed {total} recipes'))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify aggregated shopping lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only report differences, do not write anything',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify(ShoppingListItem.objects.compute())
+            return
+        rows = ShoppingListItem.objects.rebuild(
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'rebuilt {rows} shopping list rows')
+        )
+
+    def verify(self, expected):
+        actual = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in
+            ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount'
+            )
+        }
+        mismatches = [
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        ]
+        for user_id, ingredient_id in mismatches[:20]:
+            self.stdout.write(
+                f'user {user_id}, ingredient {ingredient_id}: expected '
+                f'{expected.get((user_id, ingredient_id))}, stored '
+                f'{actual.get((user_id, ingredient_id))}'
+            )
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} rows out of sync')
+        self.stdout.write(self.style.SUCCESS('shopping lists are in sync'))
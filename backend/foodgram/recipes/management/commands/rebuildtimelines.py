@@ -0,0 +1,22 @@
+from itertools import groupby
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recipes.feed import rebuild_timeline
+from users.models import Subscribe
+
+
+class Command(BaseCommand):
+    help = 'Rebuild subscription feed timelines from the subscriptions'
+
+    def handle(self, *args, **options):
+        subscriptions = Subscribe.objects.filter(
+            author__followers_count__lte=settings.FEED_FANOUT_LIMIT
+        ).order_by('user_id').values_list('user_id', 'author_id')
+        users = 0
+        for user_id, rows in groupby(
+            subscriptions.iterator(), key=lambda row: row[0]
+        ):
+            rebuild_timeline(user_id, [author_id for _, author_id in rows])
+            users += 1
+        self.stdout.write(f'Rebuilt {users} timelines')
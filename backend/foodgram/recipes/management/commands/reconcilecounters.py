@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.backfill import COUNTERS, actual_count
+
+
+class Command(BaseCommand):
+    help = 'Recount or verify denormalized popularity counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only report differences, do not write anything',
+        )
+
+    def handle(self, *args, **options):
+        out_of_sync = 0
+        with transaction.atomic():
+            for model, field, related_model, related_field in COUNTERS:
+                actual = actual_count(related_model, related_field)
+                queryset = model.objects.exclude(**{field: actual})
+                if options['verify']:
+                    rows = queryset.count()
+                else:
+                    rows = queryset.update(**{field: actual})
+                out_of_sync += rows
+                self.stdout.write(
+                    f'{model._meta.model_name}.{field}: {rows} rows '
+                    f'out of sync'
+                )
+        if options['verify'] and out_of_sync:
+            raise CommandError(f'{out_of_sync} counters out of sync')
+        self.stdout.write(self.style.SUCCESS(
+            'counters are in sync' if options['verify']
+            else f'fixed {out_of_sync} counters'
+        ))
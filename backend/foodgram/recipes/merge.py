@@ -0,0 +1,81 @@
+"""Merging of duplicate ingredients.
+
+Older versions of ``loaddatajson`` could insert the same
+``(name, measurement_unit)`` twice. The duplicates have to be merged
+before the ``unique_ingredient`` constraint can be created, so this runs
+on ``pre_migrate``, in raw SQL since the tables may not match the
+current models yet.
+"""
+from django.db import connections, transaction
+
+from .models import Ingredient, IngredientInRecipe, Recipe, ShoppingListItem
+
+# Tables referencing ingredients: (model, owner column, amount column).
+INGREDIENT_REFERENCES = (
+    (IngredientInRecipe, 'recipe_id', 'amount'),
+    (Recipe.ingredients.through, 'recipe_id', None),
+    (ShoppingListItem, 'user_id', 'total_amount'),
+)
+
+
+def find_duplicate_ingredients(cursor, table):
+    """Map ids of duplicate ingredients to the lowest id of their group."""
+    cursor.execute(
+        f'SELECT i.id, k.keeper FROM {table} i JOIN ('
+        f'SELECT name, measurement_unit, MIN(id) AS keeper FROM {table} '
+        f'GROUP BY name, measurement_unit HAVING COUNT(*) > 1'
+        f') k ON i.name = k.name '
+        f'AND i.measurement_unit = k.measurement_unit '
+        f'WHERE i.id <> k.keeper'
+    )
+    return dict(cursor.fetchall())
+
+
+def repoint_rows(cursor, table, owner, amount, duplicate, keeper):
+    """Move rows of ``duplicate`` to ``keeper``, adding up amounts.
+
+    An owner (recipe or user) holding both ingredients keeps only the
+    ``keeper`` row.
+    """
+    holding_keeper = (
+        f'{owner} IN (SELECT {owner} FROM {table} WHERE ingredient_id = %s)'
+    )
+    if amount is not None:
+        cursor.execute(
+            f'UPDATE {table} SET {amount} = {amount} + ('
+            f'SELECT SUM(d.{amount}) FROM {table} d '
+            f'WHERE d.{owner} = {table}.{owner} AND d.ingredient_id = %s'
+            f') WHERE ingredient_id = %s AND {owner} IN ('
+            f'SELECT {owner} FROM {table} WHERE ingredient_id = %s)',
+            [duplicate, keeper, duplicate],
+        )
+    cursor.execute(
+        f'DELETE FROM {table} WHERE ingredient_id = %s AND {holding_keeper}',
+        [duplicate, keeper],
+    )
+    cursor.execute(
+        f'UPDATE {table} SET ingredient_id = %s WHERE ingredient_id = %s',
+        [keeper, duplicate],
+    )
+
+
+def merge_duplicate_ingredients(using='default', **kwargs):
+    database = connections[using]
+    quote = database.ops.quote_name
+    existing = set(database.introspection.table_names())
+    ingredients = Ingredient._meta.db_table
+    if ingredients not in existing:
+        return
+    with transaction.atomic(using=using), database.cursor() as cursor:
+        duplicates = find_duplicate_ingredients(cursor, quote(ingredients))
+        references = [
+            (quote(model._meta.db_table), owner, amount)
+            for model, owner, amount in INGREDIENT_REFERENCES
+            if model._meta.db_table in existing
+        ]
+        for duplicate, keeper in duplicates.items():
+            for table, owner, amount in references:
+                repoint_rows(cursor, table, owner, amount, duplicate, keeper)
+            cursor.execute(
+                f'DELETE FROM {quote(ingredients)} WHERE id = %s', [duplicate]
+            )
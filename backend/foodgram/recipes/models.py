@@ -1,10 +1,35 @@
+from contextlib import contextmanager
+
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core import validators
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models.functions import Greatest
+from foodgram.models import DenormalizedFieldsMixin
 
 User = get_user_model()
 
 
+def change_counter(model, pk, field, delta):
+    """Atomically add ``delta`` to a denormalized counter column.
+
+    The result is floored at zero, so a counter that lags behind the
+    rows it counts cannot break the positive integer constraint.
+    """
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(models.F(field) + delta, 0)}
+    )
+
+
+def lock_user(user_id):
+    """Serialize changes of the user's favorites and cart.
+
+    Both the single and the bulk paths take this lock, so neither can
+    count a link the other inserted concurrently.
+    """
+    User.objects.select_for_update().filter(pk=user_id).exists()
+
+
 class Tag(models.Model):
     name = models.CharField(
         max_length=200,
@@ -42,17 +67,24 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'ingredient'
         ordering = ('pk',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(DenormalizedFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='recipes',
         verbose_name='author',
+        db_index=False,
     )
     name = models.CharField(
         max_length=200,
@@ -63,6 +95,12 @@ class Recipe(models.Model):
         verbose_name='image',
         upload_to='recipes/',
     )
+    image_renditions = models.JSONField(
+        verbose_name='image renditions',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(
         verbose_name='description',
     )
@@ -73,14 +111,48 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField(
         Ingredient, verbose_name='ingredients'
     )
+    search_vector = SearchVectorField(null=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='added to favorites',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='added to shopping carts',
+        default=0,
+        editable=False,
+    )
+
+    denormalized_fields = (
+        'favorites_count', 'in_carts_count', 'image_renditions',
+        'search_vector',
+    )
 
     class Meta:
         verbose_name = 'recipe'
         ordering = ('-id',)
+        indexes = [
+            models.Index(fields=['author', '-id'], name='recipe_author_id'),
+            models.Index(
+                fields=['-favorites_count', '-id'], name='recipe_popularity'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                change_counter(User, self.author_id, 'recipes_count', 1)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            change_counter(User, self.author_id, 'recipes_count', -1)
+            return super().delete(*args, **kwargs)
+
 
 class IngredientInRecipe(models.Model):
     recipe = models.ForeignKey(
@@ -88,6 +160,7 @@ class IngredientInRecipe(models.Model):
         on_delete=models.CASCADE,
         related_name='ingredients_in_recipe',
         verbose_name='recipe',
+        db_index=False,
     )
     ingredient = models.ForeignKey(
         Ingredient,
@@ -102,9 +175,96 @@ class IngredientInRecipe(models.Model):
 
     class Meta:
         verbose_name = 'IngredientInRecipe'
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredient', 'amount'],
+                name='ingredient_in_recipe_lookup'
+            ),
+        ]
 
     def __str__(self):
-        return f'{self.recipe}-({self.ingredient} - {self.amount})'
+        return f'{self.ingredient} - {self.amount}'
+
+
+class UserRecipeManager(models.Manager):
+    """Bulk counterpart of ``save`` and ``delete`` of user-recipe links.
+
+    Links are inserted with one ``bulk_create`` and removed with one
+    filtered delete, and ``counter_field`` of the recipes is adjusted
+    in a single update. The user row is locked, so concurrent batches
+    of the same user cannot count a link twice.
+    """
+    counter_field = None
+
+    def add_recipes(self, user_id, recipe_ids):
+        """Link ``recipe_ids`` to the user, returning a status per id."""
+        with transaction.atomic():
+            found, linked = self._lock_and_split(user_id, recipe_ids)
+            added = found - linked
+            self.bulk_create(
+                [self.model(user_id=user_id, recipe_id=recipe_id)
+                 for recipe_id in added],
+                ignore_conflicts=True,
+            )
+            self.on_change(user_id, added, 1)
+        return self._statuses(recipe_ids, found, linked, 'exists', 'added')
+
+    def remove_recipes(self, user_id, recipe_ids):
+        """Unlink ``recipe_ids`` from the user, returning a status per id."""
+        with transaction.atomic():
+            found, linked = self._lock_and_split(user_id, recipe_ids)
+            self.filter(user_id=user_id, recipe_id__in=linked).delete()
+            self.on_change(user_id, linked, -1)
+        return self._statuses(
+            recipe_ids, found, found - linked, 'missing', 'removed'
+        )
+
+    def on_change(self, user_id, recipe_ids, delta):
+        if recipe_ids:
+            Recipe.objects.filter(pk__in=recipe_ids).update(**{
+                self.counter_field: Greatest(
+                    models.F(self.counter_field) + delta, 0
+                )
+            })
+
+    def _lock_and_split(self, user_id, recipe_ids):
+        lock_user(user_id)
+        found = set(Recipe.objects.filter(
+            pk__in=recipe_ids
+        ).values_list('pk', flat=True))
+        linked = set(self.filter(
+            user_id=user_id, recipe_id__in=found
+        ).values_list('recipe_id', flat=True))
+        return found, linked
+
+    @staticmethod
+    def _statuses(recipe_ids, found, matched, matched_status, status):
+        return {
+            recipe_id: (
+                'not_found' if recipe_id not in found
+                else matched_status if recipe_id in matched
+                else status
+            )
+            for recipe_id in recipe_ids
+        }
+
+
+class FavoriteManager(UserRecipeManager):
+    counter_field = 'favorites_count'
+
+
+class ShoppingCartManager(UserRecipeManager):
+    counter_field = 'in_carts_count'
+
+    def on_change(self, user_id, recipe_ids, delta):
+        super().on_change(user_id, recipe_ids, delta)
+        if recipe_ids:
+            ShoppingListItem.objects.apply_deltas([user_id], {
+                ingredient: amount * delta
+                for ingredient, amount in get_ingredient_amounts(
+                    *recipe_ids
+                ).items()
+            })
 
 
 class Favorite(models.Model):
@@ -113,14 +273,18 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         related_name='favorites',
         verbose_name='favorites list author',
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         related_name='favorites',
         verbose_name='recipe from list',
+        db_index=False,
     )
 
+    objects = FavoriteManager()
+
     class Meta:
         verbose_name = 'favorites'
         constraints = [
@@ -128,10 +292,30 @@ class Favorite(models.Model):
                 fields=['user', 'recipe'], name='unique_favorite_recipes'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'], name='favorite_recipe_user'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} added to favorites {self.recipe}'
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            if adding:
+                lock_user(self.user_id)
+            super().save(*args, **kwargs)
+            if adding:
+                change_counter(Recipe, self.recipe_id, 'favorites_count', 1)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            lock_user(self.user_id)
+            change_counter(Recipe, self.recipe_id, 'favorites_count', -1)
+            return super().delete(*args, **kwargs)
+
 
 class ShoppingCart(models.Model):
 
@@ -139,13 +323,17 @@ class ShoppingCart(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='shopping_carts',
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         related_name='shopping_carts',
+        db_index=False,
     )
 
+    objects = ShoppingCartManager()
+
     class Meta:
         verbose_name = 'shopping_cart'
         constraints = [
@@ -154,3 +342,237 @@ class ShoppingCart(models.Model):
                 name='unique_cart_user_recipes'
             )
         ]
+        indexes = [
+            models.Index(fields=['recipe', 'user'], name='cart_recipe_user'),
+        ]
+
+    # The recipe counter is changed before the shopping list, in the
+    # order recipe edits lock rows, so the two cannot deadlock.
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            if adding:
+                lock_user(self.user_id)
+            super().save(*args, **kwargs)
+            if adding:
+                change_counter(Recipe, self.recipe_id, 'in_carts_count', 1)
+                ShoppingListItem.objects.add_recipe(self.user_id, self.recipe)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            lock_user(self.user_id)
+            change_counter(Recipe, self.recipe_id, 'in_carts_count', -1)
+            ShoppingListItem.objects.remove_recipe(self.user_id, self.recipe)
+            return super().delete(*args, **kwargs)
+
+
+def get_ingredient_amounts(*recipes):
+    """Map ingredient id to its total amount in ``recipes``."""
+    return dict(
+        IngredientInRecipe.objects.filter(
+            recipe__in=recipes
+        ).values('ingredient').annotate(
+            total=models.Sum('amount')
+        ).values_list('ingredient', 'total')
+    )
+
+
+class ShoppingListItemManager(models.Manager):
+    # Rows per upsert statement, well below SQLite's parameter limit.
+    upsert_batch_size = 300
+
+    def apply_deltas(self, user_ids, deltas):
+        """Add ``deltas`` (ingredient id -> amount) to the users' lists.
+
+        Rows whose total drops to zero are removed. Additions are upserts
+        that add to the stored total, so concurrent changes creating the
+        same row do not collide. Must run in the transaction that changes
+        the underlying carts or recipes.
+        """
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return
+        added = sorted(
+            (ingredient, delta)
+            for ingredient, delta in deltas.items() if delta > 0
+        )
+        removed = {
+            ingredient: delta
+            for ingredient, delta in deltas.items() if delta < 0
+        }
+        if added:
+            self._add_totals([
+                (user_id, ingredient, delta)
+                for user_id in user_ids for ingredient, delta in added
+            ])
+        if removed:
+            items = self.filter(
+                user_id__in=user_ids, ingredient_id__in=removed
+            )
+            items.update(total_amount=Greatest(
+                models.F('total_amount') + models.Case(*(
+                    models.When(ingredient_id=ingredient, then=delta)
+                    for ingredient, delta in removed.items()
+                )),
+                0,
+            ))
+            items.filter(total_amount=0).delete()
+
+    def _add_totals(self, rows):
+        """Upsert ``(user id, ingredient id, amount)`` rows additively."""
+        meta = self.model._meta
+        database = connections[self.db]
+        quote = database.ops.quote_name
+        table = quote(meta.db_table)
+        columns = [
+            quote(meta.get_field(name).column)
+            for name in ('user', 'ingredient', 'total_amount')
+        ]
+        with database.cursor() as cursor:
+            for start in range(0, len(rows), self.upsert_batch_size):
+                batch = rows[start:start + self.upsert_batch_size]
+                cursor.execute(
+                    f'INSERT INTO {table} ({", ".join(columns)}) VALUES '
+                    + ', '.join(['(%s, %s, %s)'] * len(batch))
+                    + f' ON CONFLICT ({columns[0]}, {columns[1]}) DO UPDATE'
+                    f' SET {columns[2]} = {table}.{columns[2]}'
+                    f' + EXCLUDED.{columns[2]}',
+                    [value for row in batch for value in row],
+                )
+
+    def add_recipe(self, user_id, recipe):
+        self.apply_deltas([user_id], get_ingredient_amounts(recipe))
+
+    def remove_recipe(self, user_id, recipe):
+        self.apply_deltas([user_id], {
+            ingredient: -amount
+            for ingredient, amount in get_ingredient_amounts(recipe).items()
+        })
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """Propagate a change of recipe ingredients to carts holding it."""
+        deltas = {
+            ingredient: new_amounts.get(ingredient, 0)
+            - old_amounts.get(ingredient, 0)
+            for ingredient in old_amounts.keys() | new_amounts.keys()
+        }
+        self.apply_deltas(
+            recipe.shopping_carts.values_list('user_id', flat=True), deltas
+        )
+
+    @contextmanager
+    def tracking_recipes(self, recipe_ids):
+        """Propagate ingredient changes made in the block to carts.
+
+        For writes that bypass ``change_recipe``, such as admin forms.
+        """
+        recipes = list(Recipe.objects.using(self.db).filter(
+            id__in=recipe_ids
+        ))
+        old_amounts = {
+            recipe.id: get_ingredient_amounts(recipe) for recipe in recipes
+        }
+        yield
+        for recipe in recipes:
+            self.change_recipe(
+                recipe, old_amounts[recipe.id], get_ingredient_amounts(recipe)
+            )
+
+    def compute(self, user_ids=None):
+        """Aggregate shopping lists from scratch, keyed by (user, ingr.)."""
+        totals = IngredientInRecipe.objects.using(self.db).filter(
+            recipe__shopping_carts__isnull=False
+        )
+        if user_ids is not None:
+            totals = totals.filter(recipe__shopping_carts__user__in=user_ids)
+        totals = totals.values(
+            'recipe__shopping_carts__user', 'ingredient'
+        ).annotate(
+            total=models.Sum('amount')
+        ).values_list(
+            'recipe__shopping_carts__user', 'ingredient', 'total'
+        ).order_by()
+        return {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in totals
+        }
+
+    def rebuild(self, user_ids=None, batch_size=1000):
+        """Replace the stored lists (of ``user_ids``) by ``compute()``."""
+        expected = self.compute(user_ids)
+        with transaction.atomic(using=self.db):
+            items = self.all()
+            if user_ids is not None:
+                items = items.filter(user_id__in=user_ids)
+            items.delete()
+            self.bulk_create(
+                (
+                    self.model(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=total,
+                    )
+                    for (user_id, ingredient_id), total in expected.items()
+                ),
+                batch_size=batch_size,
+            )
+        return len(expected)
+
+
+class ShoppingListItem(models.Model):
+    """Running ingredient totals of a user's shopping cart."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        db_index=False,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='total amount',
+    )
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        verbose_name = 'shopping list item'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.total_amount}'
+
+
+class TimelineEntry(models.Model):
+    """A recipe pushed into the feed of a follower of its author."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        db_index=False,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+
+    class Meta:
+        verbose_name = 'timeline entry'
+        verbose_name_plural = 'timeline entries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_timeline_recipe'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} for {self.user}'
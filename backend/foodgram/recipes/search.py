@@ -0,0 +1,135 @@
+"""Full-text recipe search.
+
+PostgreSQL keeps a weighted ``tsvector`` in ``Recipe.search_vector``
+(name, ingredient names, description) under a GIN index and adds trigram
+similarity on the name to tolerate typos. SQLite falls back to an FTS5
+table kept next to ``recipes_recipe``.
+"""
+import re
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, TrigramSimilarity)
+from django.db import connection, connections
+from django.db.models import F, FloatField, OuterRef, Q, Subquery
+from django.db.models.expressions import RawSQL
+
+from .models import IngredientInRecipe, Recipe
+
+FTS_TABLE = 'recipes_recipe_fts'
+WORD_RE = re.compile(r'\w+')
+
+
+def is_postgresql():
+    return connection.vendor == 'postgresql'
+
+
+def create_search_structures(using='default', **kwargs):
+    """Create extensions, indexes and tables unknown to the ORM."""
+    database = connections[using]
+    with database.cursor() as cursor:
+        if database.vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS recipe_search_vector_gin '
+                'ON recipes_recipe USING gin (search_vector)'
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS recipe_name_trgm_gin '
+                'ON recipes_recipe USING gin (name gin_trgm_ops)'
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS ingredient_name_upper_pattern '
+                'ON recipes_ingredient (UPPER(name) varchar_pattern_ops)'
+            )
+        elif database.vendor == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING '
+                "fts5(name, ingredients, text, tokenize='unicode61')"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete '
+                f'AFTER DELETE ON recipes_recipe BEGIN '
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END'
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS ingredient_name_nocase '
+                'ON recipes_ingredient (name COLLATE NOCASE)'
+            )
+
+
+def update_search_index(recipe_ids):
+    """Refresh the search document of the given recipes."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    if is_postgresql():
+        config = settings.RECIPE_SEARCH_CONFIG
+        ingredient_names = IngredientInRecipe.objects.filter(
+            recipe=OuterRef('pk')
+        ).values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            search_vector=(
+                SearchVector('name', weight='A', config=config)
+                + SearchVector(
+                    Subquery(ingredient_names), weight='B', config=config
+                )
+                + SearchVector('text', weight='C', config=config)
+            )
+        )
+    elif connection.vendor == 'sqlite':
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                recipe_ids,
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+                f'SELECT recipe.id, recipe.name, '
+                f"COALESCE(group_concat(ingredient.name, ' '), ''), "
+                f'recipe.text FROM recipes_recipe recipe '
+                f'LEFT JOIN recipes_ingredientinrecipe amount '
+                f'ON amount.recipe_id = recipe.id '
+                f'LEFT JOIN recipes_ingredient ingredient '
+                f'ON ingredient.id = amount.ingredient_id '
+                f'WHERE recipe.id IN ({placeholders}) GROUP BY recipe.id',
+                recipe_ids,
+            )
+
+
+def search_recipes(queryset, query):
+    """Filter ``queryset`` by ``query`` and order it by relevance."""
+    if is_postgresql():
+        search_query = SearchQuery(
+            query,
+            search_type='websearch',
+            config=settings.RECIPE_SEARCH_CONFIG,
+        )
+        return queryset.filter(
+            Q(search_vector=search_query) | Q(name__trigram_similar=query)
+        ).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+            + TrigramSimilarity('name', query)
+        ).order_by('-search_rank', '-id')
+    words = WORD_RE.findall(query)
+    if not words:
+        return queryset.none()
+    match = ' '.join(f'"{word}"*' for word in words)
+    return queryset.filter(
+        id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,),
+        )
+    ).annotate(
+        search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 4.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND {FTS_TABLE}.rowid = recipes_recipe.id',
+            (match,),
+            output_field=FloatField(),
+        )
+    ).order_by('-search_rank', '-id')
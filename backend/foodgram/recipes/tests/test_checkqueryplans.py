@@ -0,0 +1,33 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from recipes.models import Recipe
+
+
+class CheckQueryPlansTests(TestCase):
+    sizes = {
+        'users': 200,
+        'recipes': 1000,
+        'ingredients': 100,
+        'favorites': 5000,
+        'carts': 1000,
+        'subscriptions': 2000,
+    }
+
+    def test_hot_code_paths_use_indexes(self):
+        stdout = StringIO()
+        call_command(
+            'checkqueryplans', no_seqscan=True, stdout=stdout, **self.sizes
+        )
+        output = stdout.getvalue()
+        self.assertIn('all hot code paths use indexes', output)
+        self.assertIn('recipe list: ok', output)
+        self.assertIn('subscriptions: ok', output)
+
+    def test_seeded_data_is_rolled_back(self):
+        call_command(
+            'checkqueryplans', no_seqscan=True, stdout=StringIO(),
+            **self.sizes
+        )
+        self.assertFalse(Recipe.objects.exists())
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from recipes.admin_filters import AutocompleteFilter, AutocompleteFilterMixin
 
 from .models import Subscribe, User
 
@@ -7,7 +8,14 @@ from .models import Subscribe, User
 @admin.register(User)
 class UserAdmin(UserAdmin):
     model = User
-    list_display = ("email", "username", "first_name", "last_name")
+    list_display = (
+        "email",
+        "username",
+        "first_name",
+        "last_name",
+        "recipes_count",
+        "followers_count",
+    )
     ordering = ("id",)
     search_fields = (
         "email",
@@ -16,13 +24,19 @@ class UserAdmin(UserAdmin):
         "last_name",
     )
     list_filter = (
-        "email",
-        "username",
+        "is_staff",
+        "is_active",
     )
+    show_full_result_count = False
 
 
 @admin.register(Subscribe)
-class SubscribeAdmin(admin.ModelAdmin):
+class SubscribeAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('user', 'author',)
-    search_fields = ('user', 'author',)
-    list_filter = ('user', 'author',)
+    list_select_related = ('user', 'author',)
+    search_fields = ('user__username', 'author__username',)
+    list_filter = (
+        ('user', AutocompleteFilter), ('author', AutocompleteFilter),
+    )
+    autocomplete_fields = ('user', 'author',)
+    show_full_result_count = False
@@ -1,8 +1,10 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Greatest
+from foodgram.models import DenormalizedFieldsMixin
 
 
-class User(AbstractUser):
+class User(DenormalizedFieldsMixin, AbstractUser):
     class AccessLevels(models.TextChoices):
         ADMIN = "admin"
         AUTHORIZED = "authorized user"
@@ -45,8 +47,19 @@ class User(AbstractUser):
         related_name="following",
         blank=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name="recipes",
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name="followers",
+        default=0,
+        editable=False,
+    )
     REQUIRED_FIELDS = ["username", "password", "first_name", "last_name"]
     USERNAME_FIELD = "email"
+    denormalized_fields = ("recipes_count", "followers_count")
 
     class Meta:
         ordering = ("id",)
@@ -66,11 +79,13 @@ class Subscribe(models.Model):
         User,
         related_name="following",
         on_delete=models.CASCADE,
+        db_index=False,
     )
     user = models.ForeignKey(
         User,
         related_name="follower",
         on_delete=models.CASCADE,
+        db_index=False,
     )
 
     class Meta:
@@ -80,6 +95,28 @@ class Subscribe(models.Model):
                 fields=["user", "author"], name="unique_subscribe"
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["author", "user"], name="subscribe_author_user"
+            ),
+        ]
 
     def __str__(self):
         return self.user.username
+
+    def change_followers_count(self, delta):
+        User.objects.filter(pk=self.author_id).update(
+            followers_count=Greatest(models.F("followers_count") + delta, 0)
+        )
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                self.change_followers_count(1)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self.change_followers_count(-1)
+            return super().delete(*args, **kwargs)